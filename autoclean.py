@@ -1,11 +1,24 @@
 import os
 import datetime
-import hashlib
+import errno
 import schedule
 import threading
 import time
 from pathlib import Path
 from database import DatabaseHandler
+from hashing import HashingEngine
+from jobs import JobCancelled
+from manifest import ManifestWriter, count_entries, matches_fingerprint, read_manifest
+from metrics import MetricsRecorder
+from settings import AUTOCLEAN_SETTINGS, SettingsStore
+from snapshot import MetadataSnapshot, UnusedFilePolicy
+from catalog import CatalogEntry, CatalogStat, DirectoryCatalog
+from traversal import list_directory, walk_entries
+
+# bytes read from both the head and the tail of a file before committing to a full hash
+PARTIAL_HASH_BYTES = 64 * 1024
+# most recently used rows kept in the FileHashes table
+HASH_CACHE_MAX_ROWS = 200000
 
 class AutoCleanHandler:
     def __init__(self):
@@ -19,12 +32,35 @@ class AutoCleanHandler:
         self.clean_unused_files_flag = None
         self.clean_empty_folders_flag = None
         self.db_handler = DatabaseHandler()
+        self.settings = SettingsStore.for_database(self.db_handler)
         self.is_running = False
+        # held while a clean, plan or apply runs, since they share job, metrics and manifest on the handler: a
+        # scheduled clean is skipped while one runs and the others wait. Reentrant, as activate_selected_AC holds it
+        # around clean_directories
+        self.cleaning_lock = threading.RLock()
+        self.duplicate_scan_stats = {}
+        self.empty_folder_stats = {}
+        self.catalog_stats = {}
+        self.modified_directories = set()
+        self.use_catalog = True
+        self.hash_cache = {}
+        self.hash_cache_updates = {}
+        self.removed_duplicates = set()
+        self.hashing_engine = HashingEngine(algorithm='blake2b')
+        self.job = None
+        self.metrics = None
+        self.manifest = None
+        self.unused_file_policy = UnusedFilePolicy()
+        # when set, the metadata of each root cleaned for unused files is kept for previewing other policies
+        # without a walk; off by default, since it holds a row per file until the next clean
+        self.keep_snapshots = False
+        self.snapshots = {}
         self.load_settings()
+        self.settings.subscribe(self.on_settings_changed)
 
     def load_settings(self):
         try:
-            settings = self.db_handler.get_autoclean_settings()
+            settings = self.settings.get_autoclean_settings()
             if settings:
                 self.clean_empty_folders_flag = settings['clean_empty_folders_flag']
                 self.clean_unused_files_flag = settings['clean_unused_files_flag']
@@ -44,8 +80,13 @@ class AutoCleanHandler:
         except Exception as e:
             self.db_handler.log_error(f"Error loading settings: {str(e)}")
 
+    def on_settings_changed(self, changes):
+        # another handler or the UI changed the AutoClean settings
+        if any(name in changes for name in AUTOCLEAN_SETTINGS):
+            self.load_settings()
+
     def save_settings(self):
-        self.db_handler.update_clean_flags(
+        self.settings.update(
             clean_empty_folders_flag=self.clean_empty_folders_flag,
             clean_unused_files_flag=self.clean_unused_files_flag,
             clean_duplicate_files_flag=self.clean_duplicate_files_flag,
@@ -101,84 +142,466 @@ class AutoCleanHandler:
         self.clean_browser_history_flag = value
         self.save_settings()
 
-    def activate_selected_AC(self, force=False):
-        if force or (self.next_cleaning_time and datetime.datetime.now() >= self.next_cleaning_time):
-            print("Cleaning started...")
-            self.previous_cleaning_time = datetime.datetime.now()
-            self.save_settings()
-            self.update_next_cleaning_time()
-            self.save_settings()
-
-            directories = [
-                os.path.join(self.user_home_directory, 'Desktop'),
-                os.path.join(self.user_home_directory, 'Downloads'),
-                os.path.join(self.user_home_directory, 'Desktop'),
-                os.path.join(self.user_home_directory, 'AppData', 'Local', 'Temp')
-            ]
-
-            if self.clean_empty_folders_flag:
-                for directory in directories:
-                    self.clean_empty_folders(directory)
-
-            if self.clean_unused_files_flag:
-                for directory in directories:
-                    self.clean_unused_files(directory)
-
-            if self.clean_duplicate_files_flag:
-                for directory in directories:
-                    self.clean_duplicate_files(directory)
-
-            if self.clean_recycling_bin_flag:
-                self.clean_recycling_bin()
+    def is_cleaning_due(self):
+        return bool(self.next_cleaning_time and datetime.datetime.now() >= self.next_cleaning_time)
 
-            if self.clean_browser_history_flag:
-                self.clean_browser_history()
-
-    def clean_empty_folders(self, root_directory):
+    def activate_selected_AC(self, force=False, job=None):
+        if not (force or self.is_cleaning_due()):
+            return
+        if not self.cleaning_lock.acquire(blocking=False):
+            print("A clean is already running")
+            return
         try:
-            for root, dirs, _ in os.walk(root_directory):
-                for d in dirs:
-                    folder_path = os.path.join(root, d)
-                    if not os.listdir(folder_path):
-                        print(f"Deleting empty folder: {folder_path}")
-                        os.rmdir(folder_path)
-        except Exception as e:
-            self.db_handler.log_error(f"Error cleaning empty folders in {root_directory}: {str(e)}")
+            self.run_selected_cleaners(job)
+        finally:
+            self.cleaning_lock.release()
 
+    def run_selected_cleaners(self, job=None):
+        print("Cleaning started...")
+        self.previous_cleaning_time = datetime.datetime.now()
+        self.save_settings()
+        self.update_next_cleaning_time()
+        self.save_settings()
 
-    def clean_unused_files(self, root_directory):
+        if self.clean_empty_folders_flag or self.clean_unused_files_flag or self.clean_duplicate_files_flag:
+            self.clean_directories(self.get_default_directories(),
+                                   empty_folders=bool(self.clean_empty_folders_flag),
+                                   unused_files=bool(self.clean_unused_files_flag),
+                                   duplicate_files=bool(self.clean_duplicate_files_flag),
+                                   job=job)
+
+        if self.clean_recycling_bin_flag:
+            self.clean_recycling_bin()
+
+        if self.clean_browser_history_flag:
+            self.clean_browser_history()
+
+    def get_default_directories(self):
+        return [
+            os.path.join(self.user_home_directory, 'Desktop'),
+            os.path.join(self.user_home_directory, 'Downloads'),
+            os.path.join(self.user_home_directory, 'AppData', 'Local', 'Temp')
+        ]
+
+    def clean_empty_folders(self, root_directory, job=None):
+        self.clean_directories([root_directory], empty_folders=True, job=job)
+
+    def clean_unused_files(self, root_directory, job=None):
+        self.clean_directories([root_directory], unused_files=True, job=job)
+
+    def clean_duplicate_files(self, root_directory, job=None):
+        self.clean_directories([root_directory], duplicate_files=True, job=job)
+
+    # progress reporting for a clean running as a background job; also counted in the run's metrics
+    def report_progress(self, **counters):
+        if self.job is not None:
+            self.job.update(**counters)
+        if self.metrics is not None:
+            for name, value in counters.items():
+                self.metrics.count(name, value)
+
+    def checkpoint(self):
+        if self.job is not None:
+            self.job.checkpoint()
+
+    def dedupe_roots(self, directories):
+        # drop missing roots, repeated roots and roots nested inside another root
+        roots = []
+        for directory in directories:
+            path = os.path.normcase(os.path.realpath(directory))
+            if os.path.isdir(path) and path not in roots:
+                roots.append(path)
+        return [root for root in roots
+                if not any(other != root and os.path.commonpath([other, root]) == other for other in roots)]
+
+    def scan_directory(self, root_directory, catalog=None):
+        # one listing per directory; yields (directory_path, entries) so every cleaner shares the same listing.
+        # With a catalog, directories whose mtime has not changed are listed from it instead of the disk
+        for directory_path, entries, _ in walk_entries(
+                root_directory, lister=catalog.list_directory if catalog is not None else list_directory,
+                on_error=lambda path, e: self.db_handler.log_error(f"Error scanning {path}: {str(e)}")):
+            yield directory_path, entries
+
+    def clean_directories(self, directories, empty_folders=False, unused_files=False, duplicate_files=False,
+                          job=None, manifest_path=None):
+        # with a manifest_path nothing is deleted: every deletion the clean would make is written to the
+        # manifest instead, to be applied later by apply_manifest
+        with self.cleaning_lock:
+            self.job = job
+            self.metrics = MetricsRecorder(self.db_handler, 'autoclean' if manifest_path is None else 'autoclean_plan')
+            self.metrics.set('completed', 0)
+            roots = self.dedupe_roots(directories)
+            if manifest_path is not None:
+                self.manifest = ManifestWriter(manifest_path, roots, {'empty_folders': empty_folders,
+                                                                      'unused_files': unused_files,
+                                                                      'duplicate_files': duplicate_files})
+            try:
+                self.clean_roots(roots, empty_folders, unused_files, duplicate_files)
+                self.metrics.set('completed', 1)
+            finally:
+                if self.manifest is not None:
+                    self.metrics.set('planned_entries', self.manifest.entries)
+                    self.metrics.set('planned_bytes', self.manifest.bytes)
+                    self.manifest.close(complete=self.metrics.counters['completed'] == 1)
+                    self.manifest = None
+                self.metrics.finish()
+                self.job = None
+                self.metrics = None
+
+    def plan_directories(self, directories, manifest_path, empty_folders=False, unused_files=False,
+                         duplicate_files=False, job=None):
+        self.clean_directories(directories, empty_folders, unused_files, duplicate_files, job=job,
+                               manifest_path=manifest_path)
+
+    def remove_file(self, file_path, file_stat, reason, original=None):
+        if self.manifest is not None:
+            self.manifest.add(file_path, file_stat, reason, *(original or ()))
+        else:
+            os.remove(file_path)
+
+    def remove_folder(self, directory_path):
+        if self.manifest is not None:
+            self.manifest.add(directory_path, os.stat(directory_path, follow_symlinks=False), 'empty_folder')
+        else:
+            print(f"Deleting empty folder: {directory_path}")
+            os.rmdir(directory_path)
+
+    def apply_manifest(self, manifest_path, job=None):
+        # Deletes what a plan recorded without scanning again. Each entry is checked against a fresh stat of its
+        # path (and of the kept copy, for a duplicate) and skipped if anything changed since the plan
+        with self.cleaning_lock:
+            self.job = job
+            self.metrics = MetricsRecorder(self.db_handler, 'autoclean_apply')
+            outcomes = {'removed': 0, 'changed': 0, 'missing': 0, 'failed': 0}
+            try:
+                if job is not None:
+                    job.set_total(count_entries(manifest_path))
+                for entry in read_manifest(manifest_path):
+                    self.checkpoint()
+                    outcome = self.apply_entry(entry)
+                    outcomes[outcome] += 1
+                    self.report_progress(files_scanned=1,
+                                         bytes_reclaimed=entry['size'] if outcome == 'removed' else 0)
+            finally:
+                for outcome, count in outcomes.items():
+                    self.metrics.set(f'entries_{outcome}', count)
+                self.metrics.finish()
+                self.job = None
+                self.metrics = None
+            print(f"Applied {manifest_path}: {outcomes['removed']} removed, {outcomes['changed']} changed since the "
+                  f"plan, {outcomes['missing']} already gone, {outcomes['failed']} failed")
+            return outcomes
+
+    def apply_entry(self, entry):
+        path = entry['path']
         try:
-            threshold = datetime.datetime.now() - datetime.timedelta(days=90)
-            for root, _, files in os.walk(root_directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if os.path.getatime(file_path) < threshold.timestamp():
-                        os.remove(file_path)
-        except Exception as e:
-            self.db_handler.log_error(f"Error cleaning unused files in {root_directory}: {str(e)}")
-
-    def clean_duplicate_files(self, root_directory):
+            if not matches_fingerprint(os.stat(path, follow_symlinks=False), entry['fingerprint']):
+                return 'changed'
+            if 'original' in entry and not matches_fingerprint(os.stat(entry['original'], follow_symlinks=False),
+                                                               entry['original_fingerprint']):
+                return 'changed'
+        except FileNotFoundError as e:
+            # the kept copy of a duplicate disappearing is a change; the entry itself disappearing is not
+            return 'missing' if e.filename == path else 'changed'
+        except OSError as e:
+            self.db_handler.log_error(f"Error checking planned deletion of {path}: {str(e)}")
+            return 'failed'
         try:
+            if entry['reason'] == 'empty_folder':
+                os.rmdir(path)
+            else:
+                os.remove(path)
+        except OSError as e:
+            if e.errno in (errno.ENOTEMPTY, errno.EEXIST):
+                return 'changed'
+            self.db_handler.log_error(f"Error applying planned deletion of {path}: {str(e)}")
+            return 'failed'
+        return 'removed'
+
+    def clean_roots(self, roots, empty_folders, unused_files, duplicate_files):
+        self.empty_folder_stats = {'removed': 0, 'seconds': 0.0}
+        self.catalog_stats = {'directories_scanned': 0, 'directories_reused': 0}
+        if duplicate_files:
+            with self.metrics.phase('db_load_hash_cache'):
+                self.load_hash_cache()
+        if self.job is not None and self.use_catalog:
+            # the previous run's catalog is the estimate of how many files this run will see
+            self.job.set_total(sum(self.db_handler.get_catalog_summary(root)['files'] for root in roots))
+        for root_directory in roots:
+            files_by_size = {}
+            # children left in each directory after this run's deletions, in the order directories were found
+            remaining_children = {}
+            self.modified_directories = set()
+            catalog = DirectoryCatalog(self.db_handler, root_directory) if self.use_catalog else None
+            snapshot = MetadataSnapshot(root_directory) if unused_files or self.keep_snapshots else None
+            scan_started = time.perf_counter()
+            for directory_path, entries in self.scan_directory(root_directory, catalog):
+                self.checkpoint()
+                if entries and isinstance(entries[0], CatalogEntry):
+                    # one scandir and a stat per entry that the catalog made unnecessary
+                    self.metrics.count('syscalls_avoided', len(entries) + 1)
+                remaining_children[directory_path] = len(entries)
+                files_scanned = 0
+                for entry in entries:
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        files_scanned += 1
+                        # DirEntry caches its stat, so each file costs at most one stat call for every cleaner
+                        file_stat = entry.stat(follow_symlinks=False)
+                        if snapshot is not None:
+                            snapshot.add(entry.path, file_stat)
+                        if duplicate_files:
+                            files_by_size.setdefault(file_stat.st_size, []).append((entry.path, file_stat))
+                    except OSError as e:
+                        self.db_handler.log_error(f"Error cleaning {entry.path}: {str(e)}")
+                self.report_progress(files_scanned=files_scanned)
+            if snapshot is not None:
+                snapshot.freeze()
+            self.metrics.add_phase('scan', time.perf_counter() - scan_started)
+
+            unused = set()
+            if unused_files:
+                with self.metrics.phase('unused_files'):
+                    unused = self.remove_unused_files(snapshot, catalog, remaining_children)
+                if unused and duplicate_files:
+                    # a file removed as unused is no longer a duplicate candidate
+                    for size, files in list(files_by_size.items()):
+                        files_by_size[size] = [item for item in files if item[0] not in unused]
+
+            if duplicate_files:
+                # duplicates are only looked for within the same root, never across roots
+                try:
+                    with self.metrics.phase('duplicates'):
+                        stats = self.remove_duplicates(files_by_size)
+                    for name in ('cached_bytes', 'size_skipped_bytes', 'partial_skipped_bytes', 'duplicates_removed'):
+                        self.metrics.count(name, stats[name])
+                    with self.metrics.phase('db_save_hash_cache'):
+                        self.save_hash_cache(root_directory, files_by_size)
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    self.db_handler.log_error(f"Error cleaning duplicate files in {root_directory}: {str(e)}")
+                for file_path in self.removed_duplicates:
+                    remaining_children[os.path.dirname(file_path)] -= 1
+                    self.modified_directories.add(os.path.dirname(file_path))
+
+            if snapshot is not None and self.keep_snapshots:
+                # kept as the tree is after this run, without the files it deleted (a plan deletes nothing)
+                if self.manifest is None:
+                    snapshot.discard(unused | (self.removed_duplicates if duplicate_files else set()))
+                self.snapshots[root_directory] = snapshot
+
+            if empty_folders:
+                with self.metrics.phase('empty_folders'):
+                    self.remove_empty_folders(root_directory, remaining_children)
+
+            if catalog is not None:
+                try:
+                    with self.metrics.phase('db_save_catalog'):
+                        # a plan deletes nothing, so every listing it made is still current
+                        catalog.save(self.modified_directories if self.manifest is None else set())
+                except Exception as e:
+                    self.db_handler.log_error(f"Error saving directory catalog for {root_directory}: {str(e)}")
+                for key, value in catalog.stats.items():
+                    self.catalog_stats[key] += value
+                    self.metrics.count(key, value)
+
+        self.metrics.set('empty_folders_removed', self.empty_folder_stats['removed'])
+        print(f"Listed {self.catalog_stats['directories_scanned']} directories from disk, "
+              f"reused {self.catalog_stats['directories_reused']} unchanged directories from the catalog")
+        if empty_folders:
+            print(f"Removed {self.empty_folder_stats['removed']} empty folders "
+                  f"in {self.empty_folder_stats['seconds']:.3f} seconds")
+
+    def remove_unused_files(self, snapshot, catalog, remaining_children):
+        # the policy is evaluated over the whole snapshot at once, so only the files it selects are touched;
+        # returns the paths of the files removed
+        now = time.time()
+        removed = set()
+        reclaimed_bytes = 0
+        for i in snapshot.select(self.unused_file_policy, now):
+            file_path = snapshot.paths[i]
+            try:
+                # each selected file is stat'ed again before it goes: a catalog atime can be stale, and a scandir
+                # stat on Windows has no device/inode for the manifest fingerprint
+                file_stat = os.stat(file_path, follow_symlinks=False)
+                if not self.unused_file_policy.matches(file_path, file_stat, now):
+                    if catalog is not None:
+                        catalog.refresh_file(file_path, file_stat)
+                    continue
+                self.remove_file(file_path, file_stat, 'unused')
+            except OSError as e:
+                self.db_handler.log_error(f"Error cleaning {file_path}: {str(e)}")
+                continue
+            removed.add(file_path)
+            reclaimed_bytes += file_stat.st_size
+            remaining_children[os.path.dirname(file_path)] -= 1
+            self.modified_directories.add(os.path.dirname(file_path))
+        self.report_progress(bytes_reclaimed=reclaimed_bytes)
+        self.metrics.count('unused_files_removed', len(removed))
+        return removed
+
+    def preview_unused_files(self, policy=None, limit=20):
+        # what a policy would remove from the roots scanned by the last clean with keep_snapshots set, answered
+        # from their snapshots instead of another walk
+        policy = policy or self.unused_file_policy
+        now = time.time()
+        preview = {'files': 0, 'bytes': 0, 'paths': []}
+        for snapshot in self.snapshots.values():
+            root_preview = snapshot.preview(policy, now, limit)
+            preview['files'] += root_preview['files']
+            preview['bytes'] += root_preview['bytes']
+            preview['paths'].extend(root_preview['paths'][:limit - len(preview['paths'])])
+        return preview
+
+    def remove_empty_folders(self, root_directory, remaining_children):
+        # scan order lists every directory before its subdirectories, so walking it backwards is post-order
+        # and a folder holding only empty folders is removed in the same pass as they are
+        started = time.perf_counter()
+        for directory_path in reversed(list(remaining_children)):
+            if directory_path == root_directory or remaining_children[directory_path]:
+                continue
+            try:
+                self.remove_folder(directory_path)
+                self.empty_folder_stats['removed'] += 1
+                remaining_children[os.path.dirname(directory_path)] -= 1
+                self.modified_directories.update((directory_path, os.path.dirname(directory_path)))
+            except OSError as e:
+                self.db_handler.log_error(f"Error cleaning empty folders in {root_directory}: {str(e)}")
+        self.empty_folder_stats['seconds'] += time.perf_counter() - started
+
+    def remove_duplicates(self, files_by_size):
+        # stage 1: a file with a unique size cannot have a duplicate
+        stats = {'files': 0, 'size_skipped_bytes': 0, 'partial_skipped_bytes': 0,
+                 'partial_hashed_bytes': 0, 'full_hashed_bytes': 0, 'cached_bytes': 0,
+                 'duplicates_removed': 0}
+        self.removed_duplicates = set()
+        self.hashing_engine.reset_stats()
+        candidates = []
+        for size, files in files_by_size.items():
+            stats['files'] += len(files)
+            if len(files) < 2:
+                stats['size_skipped_bytes'] += size * len(files)
+            else:
+                candidates.extend(files)
+        # scandir stats on Windows carry no device/inode, which the hash cache key needs, and catalog
+        # stats may predate an in-place edit, so both are re-read before trusting the hash cache
+        for i, (file_path, file_stat) in enumerate(candidates):
+            if not file_stat.st_ino or isinstance(file_stat, CatalogStat):
+                try:
+                    candidates[i] = (file_path, os.stat(file_path))
+                except OSError as e:
+                    self.db_handler.log_error(f"Error reading {file_path}: {str(e)}")
+
+        # stage 2: compare the head and tail of each file
+        partial_hashes = self.hash_with_cache(candidates, 'partial', stats)
+        by_partial_hash = {}
+        for file_path, file_stat in candidates:
+            if partial_hashes[file_path] is not None:
+                key = (file_stat.st_size, partial_hashes[file_path])
+                by_partial_hash.setdefault(key, []).append((file_path, file_stat))
+
+        # stage 3: full hash only for files that still collide
+        colliding = []
+        for (size, _), files in by_partial_hash.items():
+            partial_read = min(size, 2 * PARTIAL_HASH_BYTES)
+            if len(files) < 2:
+                stats['partial_skipped_bytes'] += size - partial_read
+            elif size > partial_read:
+                colliding.extend(files)
+        full_hashes = self.hash_with_cache(colliding, 'full', stats)
+
+        for (size, partial_hash), files in by_partial_hash.items():
+            if len(files) < 2:
+                continue
             seen_files = {}
-            for root, _, files in os.walk(root_directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_hash = self.hash_file(file_path)
-                    if file_hash in seen_files:
-                        os.remove(file_path)
-                    else:
-                        seen_files[file_hash] = file_path
-        except Exception as e:
-            self.db_handler.log_error(f"Error cleaning duplicate files in {root_directory}: {str(e)}")
-
+            # parallel traversal finds files in no fixed order, so the copy with the first path is kept
+            for file_path, file_stat in sorted(files, key=lambda file: file[0]):
+                # files no larger than the partial read are already fully covered by their partial hash
+                file_hash = full_hashes.get(file_path) if file_path in full_hashes else partial_hash
+                if file_hash is None:
+                    continue
+                if file_hash in seen_files:
+                    self.remove_file(file_path, file_stat, 'duplicate', original=seen_files[file_hash])
+                    self.removed_duplicates.add(file_path)
+                    stats['duplicates_removed'] += 1
+                    self.report_progress(bytes_reclaimed=size)
+                else:
+                    seen_files[file_hash] = (file_path, file_stat)
+
+        stats['hashing'] = self.hashing_engine.get_throughput()
+        self.duplicate_scan_stats = stats
+        print(f"Duplicate scan: {stats['files']} files, "
+              f"{stats['size_skipped_bytes']} bytes skipped by size, "
+              f"{stats['partial_skipped_bytes']} bytes skipped by partial hash, "
+              f"{stats['cached_bytes']} bytes served from the hash cache, "
+              f"{stats['full_hashed_bytes']} bytes fully hashed at "
+              f"{stats['hashing']['mib_per_second']:.1f} MiB/s on {stats['hashing']['workers']} workers, "
+              f"{stats['duplicates_removed']} duplicates removed")
+        return stats
+
+    def hash_with_cache(self, files, kind, stats):
+        hashes = {}
+        to_hash = []
+        for file_path, file_stat in files:
+            read_bytes = file_stat.st_size if kind == 'full' else min(file_stat.st_size, 2 * PARTIAL_HASH_BYTES)
+            cached = self.get_cached_hash(file_stat, kind)
+            if cached is None:
+                to_hash.append((file_path, file_stat))
+                stats[f'{kind}_hashed_bytes'] += read_bytes
+            else:
+                hashes[file_path] = cached
+                stats['cached_bytes'] += read_bytes
+
+        partial_bytes = PARTIAL_HASH_BYTES if kind == 'partial' else None
+        results = self.hashing_engine.hash_files(
+            [(file_path, file_stat.st_size) for file_path, file_stat in to_hash], partial_bytes,
+            on_progress=lambda read_bytes: self.report_progress(bytes_hashed=read_bytes),
+            checkpoint=self.checkpoint)
+        for file_path, e in self.hashing_engine.errors:
+            self.db_handler.log_error(f"Error hashing file {file_path}: {str(e)}")
+        for file_path, file_stat in to_hash:
+            hashes[file_path] = results.get(file_path)
+            self.set_cached_hash(file_path, file_stat, kind, hashes[file_path])
+        return hashes
+
+    # Hash cache: rows are keyed by (device, inode, size, mtime_ns) so an unchanged file is never read twice
+    def load_hash_cache(self):
+        self.hash_cache = self.db_handler.get_file_hashes()
+        self.hash_cache_updates = {}
+
+    def get_cached_hash(self, file_stat, kind):
+        key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+        cached = self.hash_cache_updates.get(key)
+        if cached is None and key in self.hash_cache:
+            # carry the row into this run's updates so its last_used time is refreshed
+            cached = self.hash_cache_updates[key] = self.hash_cache[key]
+        # cached hashes are stored as "algorithm:hexdigest" so switching algorithms never mixes digests
+        prefix = f"{self.hashing_engine.algorithm}:"
+        if cached and cached[kind] and cached[kind].startswith(prefix):
+            return cached[kind][len(prefix):]
+        return None
+
+    def set_cached_hash(self, file_path, file_stat, kind, file_hash):
+        if file_hash is None:
+            return
+        key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+        cached = self.hash_cache_updates.get(key) or self.hash_cache.get(key) or {'partial': None, 'full': None}
+        self.hash_cache_updates[key] = dict(cached, path=file_path,
+                                            **{kind: f"{self.hashing_engine.algorithm}:{file_hash}"})
+
+    def save_hash_cache(self, root_directory, files_by_size):
+        seen_paths = {file_path for files in files_by_size.values() for file_path, _ in files}
+        seen_paths -= self.removed_duplicates
+        self.db_handler.save_file_hashes(self.hash_cache_updates)
+        self.db_handler.evict_file_hashes(root_directory, seen_paths)
+        self.db_handler.cap_file_hashes(HASH_CACHE_MAX_ROWS)
+        self.hash_cache_updates = {}
 
     def hash_file(self, file_path):
         try:
-            hash_md5 = hashlib.md5()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
+            return self.hashing_engine.hash_file(file_path)
         except Exception as e:
             self.db_handler.log_error(f"Error hashing file {file_path}: {str(e)}")
             return None
@@ -214,12 +637,14 @@ class AutoCleanHandler:
                         self.db_handler.log_error(f"Error cleaning browser history: {str(e)}")
 
     def run_auto_cleaning(self):
-        if not self.is_running:
-            self.activate_selected_AC()
+        self.activate_selected_AC()
 
     def schedule_cleaning(self, frequency):
-        self.set_clean_frequency(frequency)
-        schedule.every().day.at("05:00").do(self.run_auto_cleaning).tag('auto_clean')
+        # a clean already due or scheduled keeps its time; only a new frequency moves it
+        if frequency != self.frequency or self.next_cleaning_time is None:
+            self.set_clean_frequency(frequency)
+        # checked every minute, so a clean runs once it falls due rather than at the next fixed hour
+        schedule.every().minute.do(self.run_auto_cleaning).tag('auto_clean')
 
         def scheduler_thread():
             while self.is_running:  # Keep checking if the scheduler is active
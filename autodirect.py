@@ -1,13 +1,70 @@
+import errno
 import os
 import shutil
+import threading
+import time
 import schedule
+from concurrent.futures import ThreadPoolExecutor
 from database import DatabaseHandler
+from matcher import KeywordMatcher
+from metrics import MetricsRecorder
+from traversal import walk_entries
+
+# a new file is only redirected once its size and mtime have stopped changing for this long
+SETTLE_SECONDS = 2.0
+# cross-device moves copy the whole file, so only a few run at once and only a few more may queue up
+MOVE_WORKERS = 4
+MOVE_QUEUE_SIZE = 16
+# waits between attempts to move a file another process still has open
+MOVE_RETRY_DELAYS = (0.5, 1.0, 2.0, 4.0, 8.0)
+# a destination's name index is listed again after this long, to notice files removed by other programs
+DESTINATION_INDEX_SECONDS = 30.0
+
+
+class RedirectEventHandler:
+    # watchdog only calls dispatch(), so this does not subclass FileSystemEventHandler and watchdog is
+    # imported only once watching actually starts
+    def __init__(self, auto_direct_handler):
+        self.auto_direct_handler = auto_direct_handler
+
+    def dispatch(self, event):
+        handler = getattr(self, f"on_{event.event_type}", None)
+        if handler is not None:
+            handler(event)
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.auto_direct_handler.queue_file(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.auto_direct_handler.queue_file(event.dest_path)
+
+    def on_modified(self, event):
+        # a file still being written keeps pushing its settle time back
+        if not event.is_directory:
+            self.auto_direct_handler.touch_pending_file(event.src_path)
+
 
 class AutoDirectHandler:
-    def __init__(self):
+    def __init__(self, use_watchdog=True):
         self.db_handler = DatabaseHandler()
         self.redirects = self.db_handler.get_redirects()
         self.is_paused = False
+        self.use_watchdog = use_watchdog
+        self.observer = None
+        self.redirect_groups = {}
+        self.pending_files = {}
+        self.pending_lock = threading.Lock()
+        self.settle_thread = None
+        self.catch_up_thread = None
+        self.stop_watching_event = threading.Event()
+        self.destination_index = {}
+        self.destination_suffixes = {}
+        self.in_flight_moves = set()
+        self.destination_lock = threading.Lock()
+        self.move_executor = ThreadPoolExecutor(max_workers=MOVE_WORKERS)
+        self.move_slots = threading.BoundedSemaphore(MOVE_QUEUE_SIZE)
         self.load_scheduled_redirects()
         self.file_mappings = []
         self.paused = False
@@ -22,13 +79,65 @@ class AutoDirectHandler:
     def clear_mappings(self):
         self.file_mappings = []
 
-    def load_scheduled_redirects(self):
-        schedule.clear()
+    def load_scheduled_redirects(self, job=None):
+        # only AutoDirect's own jobs: the schedule is shared with AutoClean
+        schedule.clear('autodirect')
+        self.stop_watching()
         self.redirects = self.db_handler.get_redirects()
+        self.compile_redirects()
+        if self.use_watchdog:
+            self.start_watching(job)
+            return
+        # one job per source directory, however many rules share it
+        for from_directory in self.redirect_groups:
+            schedule.every(10).minutes.do(self.check_source_directory, from_directory).tag('autodirect')
+
+    def compile_redirects(self):
+        # group rules by source directory and compile each group's keywords into one matcher
+        self.redirect_groups = {}
+        rules_by_source = {}
         for redirect in self.redirects:
-            schedule.every(10).minutes.do(self.check_redirect, redirect)
+            rules_by_source.setdefault(redirect[2], []).append(redirect)
+        for from_directory, rules in rules_by_source.items():
+            rules.sort(key=lambda redirect: redirect[0])
+            self.redirect_groups[from_directory] = (KeywordMatcher([redirect[1] for redirect in rules]), rules)
+
+    def match_redirect(self, from_directory, file_name):
+        # when several keywords match, the longest keyword wins, then the oldest rule
+        matcher, rules = self.redirect_groups[from_directory]
+        matched = matcher.find_all(file_name)
+        if not matched:
+            return None
+        return rules[min(matched, key=lambda index: (-len(rules[index][1]), index))]
 
-    def check_redirect(self, redirect):
+    def check_source_directory(self, from_directory, job=None):
+        if self.is_paused or from_directory not in self.redirect_groups or not os.path.exists(from_directory):
+            return
+        to_directories = {redirect[3] for redirect in self.redirect_groups[from_directory][1]}
+        metrics = MetricsRecorder(self.db_handler, 'autodirect')
+        try:
+            # never descend into a destination that lives inside its own source
+            for _, entries, _ in walk_entries(
+                    from_directory,
+                    prune=lambda entry: any(self.is_inside(entry.path, to_directory) for to_directory in to_directories)):
+                if job is not None:
+                    job.checkpoint()
+                    job.update(files_scanned=len(entries))
+                metrics.count('files_scanned', len(entries))
+                for entry in entries:
+                    redirect = self.match_redirect(from_directory, entry.name)
+                    if redirect is None or entry.is_dir() or not os.path.exists(redirect[3]):
+                        continue
+                    try:
+                        self.redirect_file(entry.path, redirect[3])
+                        metrics.count('files_redirected')
+                    except Exception as e:
+                        metrics.count('errors')
+                        self.db_handler.log_error(f"Error redirecting {entry.path}: {str(e)}")
+        finally:
+            metrics.finish()
+
+    def check_redirect(self, redirect, job=None):
         if self.is_paused:
             return
 
@@ -38,31 +147,224 @@ class AutoDirectHandler:
             return
 
         # log action for later use in error handling and displaying error messages
-        for root, _, files in os.walk(from_directory):
-            for file in files:
-                if keyword in file:
-                    src_path = os.path.join(root, file)
-                    dst_path = os.path.join(to_directory, file)
-                    dst_path = self.resolve_conflicts(dst_path)
-                    shutil.move(src_path, dst_path)
-                    self.db_handler.log_action("redirect", src_path, dst_path)
+        metrics = MetricsRecorder(self.db_handler, 'autodirect')
+        try:
+            for _, entries, _ in walk_entries(from_directory,
+                                              prune=lambda entry: self.is_inside(entry.path, to_directory)):
+                if job is not None:
+                    job.checkpoint()
+                    job.update(files_scanned=len(entries))
+                metrics.count('files_scanned', len(entries))
+                for entry in entries:
+                    if keyword in entry.name and not entry.is_dir():
+                        self.redirect_file(entry.path, to_directory)
+                        metrics.count('files_redirected')
+        finally:
+            metrics.finish()
+
+    def redirect_file(self, src_path, to_directory):
+        dst_path = self.resolve_conflicts(os.path.join(to_directory, os.path.basename(src_path)))
+        try:
+            # a same-device move is a rename; anything else is handed to the move pool
+            if os.stat(src_path).st_dev == os.stat(to_directory).st_dev:
+                os.rename(src_path, dst_path)
+                self.finish_move(src_path, dst_path)
+                return
+        except PermissionError:
+            # most likely still open in another program; the pool retries it with backoff
+            pass
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                self.release_destination(dst_path)
+                raise
+        self.move_slots.acquire()
+        future = self.move_executor.submit(self.move_with_retry, src_path, dst_path)
+        future.add_done_callback(lambda _: self.move_slots.release())
+
+    def move_with_retry(self, src_path, dst_path):
+        for delay in MOVE_RETRY_DELAYS + (None,):
+            try:
+                shutil.move(src_path, dst_path)
+            except PermissionError as e:
+                if delay is not None:
+                    time.sleep(delay)
+                    continue
+                error = e
+            except OSError as e:
+                error = e
+            else:
+                self.finish_move(src_path, dst_path)
+                return
+            self.release_destination(dst_path)
+            self.db_handler.log_action("redirect", src_path, dst_path, success=False)
+            self.db_handler.log_error(f"Error redirecting {src_path}: {str(error)}")
+            return
+
+    def finish_move(self, src_path, dst_path):
+        with self.destination_lock:
+            self.in_flight_moves.discard(os.path.normcase(dst_path))
+        self.db_handler.log_action("redirect", src_path, dst_path)
+
+    def is_inside(self, path, directory):
+        try:
+            return os.path.commonpath([os.path.abspath(path), os.path.abspath(directory)]) == os.path.abspath(directory)
+        except ValueError:
+            return False
 
+    # Event-driven mode: one observer watches every from_directory instead of rescanning on a timer
+    def start_watching(self, job=None):
+        from_directories = {from_directory for from_directory in self.redirect_groups if os.path.isdir(from_directory)}
+        # a fresh event each time, so a catch-up left from an earlier start still sees its own stop
+        self.stop_watching_event = threading.Event()
+        if from_directories:
+            from watchdog.observers import Observer
+            self.observer = Observer()
+            event_handler = RedirectEventHandler(self)
+            for from_directory in from_directories:
+                self.observer.schedule(event_handler, from_directory, recursive=True)
+            self.observer.daemon = True
+            self.observer.start()
+            self.settle_thread = threading.Thread(target=self.settle_pending_files, daemon=True)
+            self.settle_thread.start()
+
+        # one catch-up scan picks up whatever arrived while Peanut was not running. It runs after the observer
+        # is started so nothing arriving in between is missed, and cancelling it as a job leaves watching on.
+        # Without a job it gets its own thread: the handler is built on the Tk thread at startup, which must not
+        # wait for a walk of every source folder
+        if job is not None:
+            self.check_all_sources(job)
+        else:
+            self.catch_up_thread = threading.Thread(target=self.catch_up, args=(self.stop_watching_event,),
+                                                    daemon=True)
+            self.catch_up_thread.start()
+
+    def catch_up(self, stop_event):
+        for from_directory in list(self.redirect_groups):
+            if stop_event.is_set():
+                return
+            self.check_source_directory(from_directory)
+
+    def check_all_sources(self, job=None):
+        for from_directory in list(self.redirect_groups):
+            self.check_source_directory(from_directory, job)
+
+    def wait_for_moves(self):
+        # blocks until every queued cross-device or retried move has finished
+        self.move_executor.shutdown(wait=True)
+        self.move_executor = ThreadPoolExecutor(max_workers=MOVE_WORKERS)
+
+    def stop_watching(self):
+        self.stop_watching_event.set()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+        if self.settle_thread is not None:
+            self.settle_thread.join()
+            self.settle_thread = None
+        with self.pending_lock:
+            self.pending_files.clear()
+
+    def queue_file(self, file_path):
+        if self.is_paused:
+            return
+        with self.pending_lock:
+            self.pending_files[file_path] = (None, time.monotonic())
+
+    def touch_pending_file(self, file_path):
+        with self.pending_lock:
+            if file_path in self.pending_files:
+                self.pending_files[file_path] = (None, time.monotonic())
+
+    def settle_pending_files(self):
+        while not self.stop_watching_event.wait(SETTLE_SECONDS / 4):
+            now = time.monotonic()
+            ready = []
+            with self.pending_lock:
+                for file_path, (signature, changed_at) in list(self.pending_files.items()):
+                    try:
+                        file_stat = os.stat(file_path)
+                    except OSError:
+                        # moved or deleted before it settled
+                        del self.pending_files[file_path]
+                        continue
+                    current = (file_stat.st_size, file_stat.st_mtime_ns)
+                    if current != signature:
+                        self.pending_files[file_path] = (current, now)
+                    elif now - changed_at >= SETTLE_SECONDS:
+                        del self.pending_files[file_path]
+                        ready.append(file_path)
+            for file_path in ready:
+                self.redirect_settled_file(file_path)
+
+    def redirect_settled_file(self, file_path):
+        if self.is_paused:
+            return
+        for from_directory in self.redirect_groups:
+            if not self.is_inside(file_path, from_directory):
+                continue
+            redirect = self.match_redirect(from_directory, os.path.basename(file_path))
+            if redirect is None or self.is_inside(file_path, redirect[3]) or not os.path.exists(redirect[3]):
+                continue
+            try:
+                self.redirect_file(file_path, redirect[3])
+            except Exception as e:
+                self.db_handler.log_error(f"Error redirecting {file_path}: {str(e)}")
+            return
+
+    # Destination name index: free names are found in memory instead of probing "name (1)", "name (2)", ...
+    # on disk for every file. The chosen name is reserved until its move finishes or fails
     def resolve_conflicts(self, dst_path):
-        if os.path.exists(dst_path):
-            base, ext = os.path.splitext(dst_path)
-            i = 1
-            while os.path.exists(f"{base} ({i}){ext}"):
+        to_directory, file_name = os.path.split(os.path.normpath(dst_path))
+        base, ext = os.path.splitext(file_name)
+        with self.destination_lock:
+            names = self.get_destination_names(to_directory)
+            suffix_key = (os.path.normcase(to_directory), os.path.normcase(file_name))
+            i = self.destination_suffixes.get(suffix_key, 0)
+            while True:
+                candidate = file_name if i == 0 else f"{base} ({i}){ext}"
+                if os.path.normcase(candidate) not in names:
+                    # one probe catches a file another program created since the directory was listed
+                    if not os.path.lexists(os.path.join(to_directory, candidate)):
+                        break
+                    names.add(os.path.normcase(candidate))
                 i += 1
-            dst_path = f"{base} ({i}){ext}"
+            names.add(os.path.normcase(candidate))
+            self.destination_suffixes[suffix_key] = i
+            dst_path = os.path.join(to_directory, candidate)
+            self.in_flight_moves.add(os.path.normcase(dst_path))
         return dst_path
 
+    def get_destination_names(self, to_directory):
+        # called with destination_lock held
+        key = os.path.normcase(to_directory)
+        listed_at, names = self.destination_index.get(key, (None, None))
+        if listed_at is None or time.monotonic() - listed_at > DESTINATION_INDEX_SECONDS:
+            names = {os.path.normcase(name) for name in os.listdir(to_directory)}
+            # names reserved for moves still running are taken even though nothing is there yet
+            names.update(os.path.basename(path) for path in self.in_flight_moves if os.path.dirname(path) == key)
+            self.destination_index[key] = (time.monotonic(), names)
+            self.destination_suffixes = {suffix_key: i for suffix_key, i in self.destination_suffixes.items()
+                                         if suffix_key[0] != key}
+        return names
+
+    def release_destination(self, dst_path):
+        to_directory, file_name = os.path.split(os.path.normcase(dst_path))
+        with self.destination_lock:
+            self.in_flight_moves.discard(os.path.normcase(dst_path))
+            if to_directory in self.destination_index:
+                self.destination_index[to_directory][1].discard(file_name)
+            self.destination_suffixes = {suffix_key: i for suffix_key, i in self.destination_suffixes.items()
+                                         if suffix_key[0] != to_directory}
+
     def pause_operations(self):
         self.is_paused = True
+        self.stop_watching()
 
     def resume_operations(self):
         self.is_paused = False
         self.load_scheduled_redirects()
 
-    def update_redirects(self):
+    def update_redirects(self, job=None):
         self.redirects = self.db_handler.get_redirects()
-        self.load_scheduled_redirects()
+        self.load_scheduled_redirects(job)
@@ -0,0 +1,55 @@
+import os
+import random
+import time
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def generate_tree(root, files=2000, depth=4, fanout=4, median_size=4096, size_sigma=1.5, max_size=8 * 1024 * 1024,
+                  duplicate_ratio=0.2, atime_spread_days=180, empty_dirs=50, keyword='report', keyword_ratio=0.1,
+                  seed=0):
+    # Builds the same tree for the same arguments: a directory tree depth levels deep with fanout
+    # subdirectories each, files sizes drawn from a log-normal distribution, duplicate_ratio of the files
+    # copying an earlier file's contents, access times spread over atime_spread_days and keyword_ratio
+    # of the names containing keyword. Returns a summary of what was written.
+    rng = random.Random(seed)
+    now = time.time()
+    directories = [root]
+    level = [root]
+    for current_depth in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(fanout):
+                next_level.append(os.path.join(parent, f"dir{current_depth}_{i}"))
+        directories.extend(next_level)
+        level = next_level
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+
+    summary = {'files': files, 'directories': len(directories), 'bytes': 0, 'duplicates': 0, 'unused': 0,
+               'keyword_files': 0, 'empty_dirs': empty_dirs}
+    contents = []
+    for i in range(files):
+        if contents and rng.random() < duplicate_ratio:
+            data = rng.choice(contents)
+            summary['duplicates'] += 1
+        else:
+            size = min(max_size, int(rng.lognormvariate(0, size_sigma) * median_size))
+            data = rng.randbytes(size)
+            contents.append(data)
+        has_keyword = rng.random() < keyword_ratio
+        name = f"{keyword}_{i}.txt" if has_keyword else f"file_{i}.txt"
+        path = os.path.join(rng.choice(directories), name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        atime = now - rng.uniform(0, atime_spread_days) * DAY_SECONDS
+        os.utime(path, (atime, now))
+        summary['bytes'] += len(data)
+        summary['keyword_files'] += has_keyword
+        summary['unused'] += atime < now - 90 * DAY_SECONDS
+
+    # chains of empty folders, some nested inside one another
+    for i in range(empty_dirs):
+        parent = rng.choice(directories)
+        os.makedirs(os.path.join(parent, f"empty_{i}", "inner" if i % 2 else ""), exist_ok=True)
+    return summary
@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import generate_tree
+
+BENCHMARKS = ('clean_duplicate_files', 'clean_empty_folders', 'clean_unused_files', 'check_redirect',
+              'multi_search_for_files')
+
+
+def run_benchmark(name, root, keyword):
+    # returns the seconds taken by the operation alone; handler construction is not timed
+    if name in ('clean_duplicate_files', 'clean_empty_folders', 'clean_unused_files'):
+        from autoclean import AutoCleanHandler
+        handler = AutoCleanHandler()
+        operation = lambda: getattr(handler, name)(root)
+    elif name == 'check_redirect':
+        from autodirect import AutoDirectHandler
+        handler = AutoDirectHandler()
+        to_directory = f"{root}_redirected"
+        os.makedirs(to_directory)
+        operation = lambda: handler.check_redirect((1, keyword, root, to_directory))
+    else:
+        from multisearch import MultiSearchHandler
+        handler = MultiSearchHandler()
+        operation = lambda: handler.multi_search_for_files(keyword, root)
+    started = time.perf_counter()
+    operation()
+    return time.perf_counter() - started
+
+
+def run_all(names, tree_options, repeat):
+    results = {}
+    for name in names:
+        runs = []
+        for run in range(repeat):
+            # every run gets a freshly generated tree under a new path, so no run benefits from the
+            # catalog or hash cache another run left in peanut.db
+            root = os.path.abspath(f"{name}_{run}")
+            summary = generate_tree(root, **tree_options)
+            runs.append(run_benchmark(name, root, tree_options.get('keyword', 'report')))
+            shutil.rmtree(root, ignore_errors=True)
+            shutil.rmtree(f"{root}_redirected", ignore_errors=True)
+        results[name] = {'seconds': min(runs), 'runs': runs, 'files': summary['files'], 'bytes': summary['bytes'],
+                         'files_per_second': summary['files'] / min(runs) if min(runs) else 0.0}
+        print(f"{name}: {min(runs):.3f} s (best of {repeat}), {results[name]['files_per_second']:.0f} files/s")
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if previous and result['seconds'] > previous['seconds'] * (1 + threshold):
+            regressions.append(f"{name}: {result['seconds']:.3f} s vs {previous['seconds']:.3f} s baseline "
+                               f"(+{(result['seconds'] / previous['seconds'] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time Peanut's handlers on a synthetic file tree.")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--median-size', type=int, default=4096)
+    parser.add_argument('--size-sigma', type=float, default=1.5)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.2)
+    parser.add_argument('--atime-spread-days', type=float, default=180)
+    parser.add_argument('--empty-dirs', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="results JSON from an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="fail when a benchmark is slower than the baseline by more than this fraction")
+    args = parser.parse_args(argv)
+
+    tree_options = {'files': args.files, 'depth': args.depth, 'fanout': args.fanout,
+                    'median_size': args.median_size, 'size_sigma': args.size_sigma,
+                    'duplicate_ratio': args.duplicate_ratio, 'atime_spread_days': args.atime_spread_days,
+                    'empty_dirs': args.empty_dirs, 'seed': args.seed}
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # the handlers open peanut.db relative to the working directory, so the whole run happens in a scratch one
+    working_directory = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix='peanut-benchmark-')
+    os.chdir(scratch)
+    try:
+        results = run_all(args.only, tree_options, args.repeat)
+    finally:
+        os.chdir(working_directory)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    with open(output, 'w') as f:
+        json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'tree': tree_options, 'repeat': args.repeat,
+                   'benchmarks': results}, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
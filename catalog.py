@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+# a directory modified this close to when it was listed may have changed again within the same mtime tick
+CATALOG_RACY_NS = 2 * 1000 * 1000 * 1000
+
+CatalogStat = namedtuple('CatalogStat', ['st_size', 'st_atime', 'st_mtime_ns', 'st_ino', 'st_dev'])
+
+
+class CatalogEntry:
+    # stands in for an os.DirEntry when a directory's listing comes from the catalog
+    def __init__(self, directory_path, name, kind, file_stat):
+        self.name = name
+        self.path = os.path.join(directory_path, name)
+        self.kind = kind
+        self.file_stat = file_stat
+
+    def is_dir(self, follow_symlinks=True):
+        return self.kind == 'dir'
+
+    def is_file(self, follow_symlinks=True):
+        return self.kind == 'file'
+
+    def stat(self, follow_symlinks=True):
+        return self.file_stat
+
+
+class DirectoryCatalog:
+    def __init__(self, db_handler, root_directory):
+        self.db_handler = db_handler
+        self.root_directory = root_directory
+        self.directories = db_handler.get_catalog_directories(root_directory)
+        self.entries = db_handler.get_catalog_entries(root_directory)
+        self.recorded = {}
+        self.visited = set()
+        self.stats = {'directories_scanned': 0, 'directories_reused': 0}
+        # list_directory runs on traversal worker threads
+        self.lock = threading.Lock()
+
+    def list_directory(self, directory_path):
+        directory_stat = os.stat(directory_path)
+        with self.lock:
+            self.visited.add(directory_path)
+        cached = self.directories.get(directory_path)
+        if cached and cached[0] == directory_stat.st_mtime_ns and directory_stat.st_mtime_ns < cached[1] - CATALOG_RACY_NS:
+            # nothing was added, removed or renamed here since the last run
+            with self.lock:
+                self.stats['directories_reused'] += 1
+            return [CatalogEntry(directory_path, name, kind, CatalogStat(*file_stat))
+                    for name, kind, file_stat in self.entries.get(directory_path, [])]
+
+        with os.scandir(directory_path) as it:
+            entries = list(it)
+        with self.lock:
+            self.stats['directories_scanned'] += 1
+        self.record(directory_path, directory_stat.st_mtime_ns, entries)
+        return entries
+
+    def record(self, directory_path, mtime_ns, entries):
+        rows = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    rows.append((entry.name, 'dir', (0, 0, 0, 0, 0)))
+                elif entry.is_file(follow_symlinks=False):
+                    file_stat = entry.stat(follow_symlinks=False)
+                    rows.append((entry.name, 'file', (file_stat.st_size, file_stat.st_atime, file_stat.st_mtime_ns,
+                                                      file_stat.st_ino, file_stat.st_dev)))
+                else:
+                    rows.append((entry.name, 'other', (0, 0, 0, 0, 0)))
+            except OSError:
+                continue
+        with self.lock:
+            self.recorded[directory_path] = (mtime_ns, time.time_ns(), rows)
+
+    def refresh_file(self, file_path, file_stat):
+        # keep a re-read stat so a file in an unchanged directory is not re-checked every run
+        directory_path, name = os.path.split(file_path)
+        with self.lock:
+            if directory_path in self.recorded:
+                mtime_ns, scanned_at_ns, rows = self.recorded[directory_path]
+            elif directory_path in self.directories:
+                mtime_ns, scanned_at_ns = self.directories[directory_path]
+                rows = list(self.entries.get(directory_path, []))
+            else:
+                return
+            rows = [(row_name, kind, (file_stat.st_size, file_stat.st_atime, file_stat.st_mtime_ns,
+                                      file_stat.st_ino, file_stat.st_dev) if row_name == name else row_stat)
+                    for row_name, kind, row_stat in rows]
+            self.recorded[directory_path] = (mtime_ns, scanned_at_ns, rows)
+
+    def save(self, modified_directories):
+        # directories this run deleted from must be listed again next time; unvisited ones no longer exist
+        for directory_path in modified_directories:
+            self.recorded.pop(directory_path, None)
+        forgotten = [directory_path for directory_path in self.directories
+                     if directory_path not in self.visited or directory_path in modified_directories]
+        self.db_handler.save_catalog(self.recorded, forgotten)
+        self.recorded = {}
@@ -0,0 +1,153 @@
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# errors meaning "this copy method is not supported here", after which the next method is tried
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF, errno.EPERM,
+                      getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL)}
+KERNEL_COPY_CHUNK = 64 * 1024 * 1024
+
+
+class CopyEngine:
+    def __init__(self, workers=None, buffer_size=1024 * 1024):
+        # small files are dominated by open/create latency rather than bandwidth, so several run at once
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.buffer_size = buffer_size
+        self.use_copy_file_range = hasattr(os, 'copy_file_range')
+        self.use_sendfile = hasattr(os, 'sendfile') and os.name != 'nt'
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {'files': 0, 'bytes': 0, 'errors': 0, 'wall_seconds': 0.0,
+                          'methods': {'copy_file_range': 0, 'sendfile': 0, 'read_write': 0}}
+
+    def get_throughput(self):
+        with self.stats_lock:
+            stats = dict(self.stats, methods=dict(self.stats['methods']))
+        stats['workers'] = self.workers
+        stats['mib_per_second'] = (stats['bytes'] / (1024 * 1024) / stats['wall_seconds']
+                                   if stats['wall_seconds'] else 0.0)
+        stats['files_per_second'] = stats['files'] / stats['wall_seconds'] if stats['wall_seconds'] else 0.0
+        return stats
+
+    def copy_file(self, src_path, dst_path):
+        # same result as shutil.copy: contents and permission bits, an existing destination is overwritten
+        binary = getattr(os, 'O_BINARY', 0)
+        src_fd = os.open(src_path, os.O_RDONLY | binary)
+        try:
+            src_stat = os.fstat(src_fd)
+            if stat.S_ISDIR(src_stat.st_mode):
+                raise IsADirectoryError(errno.EISDIR, "Is a directory", src_path)
+            # truncating the destination would destroy a source that is the same file
+            try:
+                if os.path.samestat(src_stat, os.stat(dst_path)):
+                    raise shutil.SameFileError(f"{src_path} and {dst_path} are the same file")
+            except FileNotFoundError:
+                pass
+            dst_fd = os.open(dst_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | binary, 0o666)
+            try:
+                method, copied = self.copy_contents(src_fd, dst_fd, src_stat.st_size)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+        # a size of 0 may hide contents (see copy_contents); otherwise a short or long copy means the source
+        # changed or the copy failed part way
+        if src_stat.st_size and copied != src_stat.st_size:
+            raise OSError(errno.EIO, f"Copied {copied} of {src_stat.st_size} bytes", src_path)
+        os.chmod(dst_path, stat.S_IMODE(src_stat.st_mode))
+        with self.stats_lock:
+            self.stats['files'] += 1
+            self.stats['bytes'] += copied
+            self.stats['methods'][method] += 1
+        return copied
+
+    def copy_contents(self, src_fd, dst_fd, size):
+        # kernel-side copies first; files reporting size 0 may still have contents, so they are read normally
+        if size and self.use_copy_file_range:
+            copied = self.kernel_copy(lambda offset: os.copy_file_range(src_fd, dst_fd, KERNEL_COPY_CHUNK))
+            if copied is not None:
+                return 'copy_file_range', copied
+        if size and self.use_sendfile:
+            copied = self.kernel_copy(lambda offset: os.sendfile(dst_fd, src_fd, offset, KERNEL_COPY_CHUNK))
+            if copied is not None:
+                return 'sendfile', copied
+        copied = 0
+        while True:
+            chunk = os.read(src_fd, self.buffer_size)
+            if not chunk:
+                break
+            view = memoryview(chunk)
+            while view:
+                view = view[os.write(dst_fd, view):]
+            copied += len(chunk)
+        return 'read_write', copied
+
+    def kernel_copy(self, copy_chunk):
+        # None means the method is not available for this pair of files and nothing was written yet. Only called
+        # for files with a size, so nothing copied by the first call means the same (some file systems, such as
+        # procfs or a few FUSE mounts, report no error and just copy nothing)
+        copied = 0
+        try:
+            while True:
+                n = copy_chunk(copied)
+                if not n:
+                    return copied or None
+                copied += n
+        except OSError as e:
+            if copied or e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            return None
+
+    def copy_files(self, files, dst_directory, on_result=None, checkpoint=None):
+        # Copies every file into dst_directory. on_result(src_path, dst_path, copied_bytes, error) runs on the
+        # calling thread as copies finish; checkpoint() runs before each submit and may raise to stop, in which
+        # case copies already started still finish and are reported before the exception propagates
+        os.makedirs(dst_directory, exist_ok=True)
+        # files sharing a name would overwrite each other, so only the last one is copied, as copying them
+        # one after another would leave it
+        destinations = {}
+        for i, src_path in enumerate(files):
+            destinations[os.path.join(dst_directory, os.path.basename(src_path))] = i
+        started = time.perf_counter()
+        max_pending = self.workers * 4
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                src_path, dst_path = pending.pop(future)
+                try:
+                    copied, error = future.result(), None
+                except OSError as e:
+                    copied, error = 0, e
+                    with self.stats_lock:
+                        self.stats['errors'] += 1
+                if on_result is not None:
+                    on_result(src_path, dst_path, copied, error)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                try:
+                    for i, src_path in enumerate(files):
+                        dst_path = os.path.join(dst_directory, os.path.basename(src_path))
+                        if destinations[dst_path] != i:
+                            if on_result is not None:
+                                on_result(src_path, dst_path, 0,
+                                          FileExistsError(errno.EEXIST, "A later file has the same name", dst_path))
+                            continue
+                        if checkpoint is not None:
+                            checkpoint()
+                        if len(pending) >= max_pending:
+                            collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                        pending[executor.submit(self.copy_file, src_path, dst_path)] = (src_path, dst_path)
+                finally:
+                    collect(wait(list(pending)).done)
+        finally:
+            with self.stats_lock:
+                self.stats['wall_seconds'] += time.perf_counter() - started
@@ -1,13 +1,219 @@
+import atexit
+import os
 import sqlite3
 import datetime
+import threading
+import time
+
+# queued log rows are written in one transaction once this many are waiting, or after this many seconds
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_SECONDS = 2.0
+# metric runs kept per operation
+METRICS_MAX_RUNS = 1000
+# the action journal keeps at most this many rows, none older than this many days; older rows are dropped when it
+# is rotated, every few hours or after many new rows, and the freed pages are given back when a lot have piled up
+ACTION_LOG_MAX_ROWS = 2000000
+ACTION_LOG_MAX_AGE_DAYS = 180
+ACTION_LOG_ROTATE_SECONDS = 6 * 60 * 60
+ACTION_LOG_ROTATE_ROWS = 100000
+ACTION_LOG_DELETE_CHUNK = 20000
+COMPACT_FREE_FRACTION = 0.25
+# rows waiting on a locked database are kept up to this many, the oldest dropped first
+LOG_MAX_PENDING = 100000
+
+
+class LogWriter:
+    # write-behind queue for ErrorLogs and ActionLogs rows, shared by every DatabaseHandler on the same file
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending_errors = []
+        self.pending_actions = []
+        self.action_type_ids = {}
+        self.rows_since_rotation = 0
+        self.rotated_at = None
+        self.wake_event = threading.Event()
+        self.stats = {'flushes': 0, 'rows': 0, 'seconds': 0.0, 'failed': 0, 'dropped': 0}
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def add_error(self, row):
+        with self.lock:
+            self.pending_errors.append(row)
+            full = len(self.pending_errors) + len(self.pending_actions) >= LOG_BATCH_SIZE
+        if full:
+            self.wake_event.set()
+
+    def add_action(self, row):
+        self.add_actions([row])
+
+    def add_actions(self, rows):
+        with self.lock:
+            self.pending_actions.extend(rows)
+            full = len(self.pending_errors) + len(self.pending_actions) >= LOG_BATCH_SIZE
+        if full:
+            self.wake_event.set()
+
+    def run(self):
+        while True:
+            self.wake_event.wait(LOG_FLUSH_SECONDS)
+            self.wake_event.clear()
+            try:
+                self.flush()
+                if (self.rotated_at is None or time.monotonic() - self.rotated_at >= ACTION_LOG_ROTATE_SECONDS
+                        or self.rows_since_rotation >= ACTION_LOG_ROTATE_ROWS):
+                    self.rotated_at = time.monotonic()
+                    self.rows_since_rotation = 0
+                    self.rotate_action_logs()
+            except Exception as e:
+                # the writer has to outlive any one failure; the error is written with the next batch
+                self.add_error((datetime.datetime.now().isoformat(), f"Error in log writer: {str(e)}"))
+
+    def get_action_type_ids(self, conn, names):
+        # action types are stored once in ActionTypes and referenced by id from every journal row
+        missing = [name for name in names if name not in self.action_type_ids]
+        if missing:
+            conn.executemany('''INSERT OR IGNORE INTO ActionTypes (name) VALUES (?)''', [(name,) for name in missing])
+            for type_id, name in conn.execute('''SELECT type_id, name FROM ActionTypes'''):
+                self.action_type_ids[name] = type_id
+        return self.action_type_ids
+
+    def rotate_action_logs(self):
+        # drops journal rows past the row limit or older than the age limit, oldest first, in short transactions
+        # so log writes from other threads are never held up for long
+        conn = DatabaseHandler.thread_connection(self.db_file)
+        cutoff = int(time.time()) - ACTION_LOG_MAX_AGE_DAYS * 24 * 60 * 60
+        first_id, last_id = conn.execute('''SELECT MIN(action_id), MAX(action_id) FROM ActionLogs''').fetchone()
+        if first_id is None:
+            return
+        expired_id = conn.execute('''SELECT MAX(action_id) FROM ActionLogs WHERE timestamp < ?''',
+                                  (cutoff,)).fetchone()[0] or 0
+        delete_through = max(expired_id, last_id - ACTION_LOG_MAX_ROWS)
+        for chunk_end in range(first_id + ACTION_LOG_DELETE_CHUNK - 1, delete_through + ACTION_LOG_DELETE_CHUNK,
+                               ACTION_LOG_DELETE_CHUNK):
+            with conn:
+                conn.execute('''DELETE FROM ActionLogs WHERE action_id <= ?''', (min(chunk_end, delete_through),))
+        if delete_through >= first_id:
+            self.compact(conn)
+
+    def compact(self, conn):
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        total_pages = conn.execute('PRAGMA page_count').fetchone()[0]
+        if not total_pages or free_pages / total_pages < COMPACT_FREE_FRACTION:
+            return
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            conn.execute('PRAGMA incremental_vacuum')
+        else:
+            # a database created before incremental vacuuming was enabled is switched over by one full VACUUM
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        conn.execute('PRAGMA optimize')
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                errors, self.pending_errors = self.pending_errors, []
+                actions, self.pending_actions = self.pending_actions, []
+            if not errors and not actions:
+                return
+            started = time.perf_counter()
+            written = 0
+            try:
+                conn = DatabaseHandler.thread_connection(self.db_file)
+                if errors:
+                    with conn:
+                        conn.executemany('''INSERT INTO ErrorLogs (timestamp, description) VALUES (?, ?)''', errors)
+                    written, errors = len(errors), []
+                if actions:
+                    with conn:
+                        type_ids = self.get_action_type_ids(conn, {action[1] for action in actions})
+                        conn.executemany('''INSERT INTO ActionLogs (timestamp, type_id, success, src_path, dst_path)
+                                             VALUES (?, ?, ?, ?, ?)''',
+                                         [(timestamp, type_ids[action_type], success, src_path, dst_path)
+                                          for timestamp, action_type, success, src_path, dst_path in actions])
+                    self.rows_since_rotation += len(actions)
+                    written, actions = written + len(actions), []
+            except sqlite3.OperationalError as e:
+                # a locked or busy database: the rows go back to the front of the queue for the next flush
+                self.action_type_ids = {}
+                self.requeue(errors, actions, f"Error writing {len(errors) + len(actions)} log rows: {str(e)}")
+            except sqlite3.Error as e:
+                # anything else would fail the same way on every retry, so the batch is dropped and counted
+                self.action_type_ids = {}
+                with self.lock:
+                    self.stats['dropped'] += len(errors) + len(actions)
+                    self.pending_errors.append((datetime.datetime.now().isoformat(),
+                                                f"Dropped {len(errors) + len(actions)} log rows: {str(e)}"))
+            with self.lock:
+                self.stats['flushes'] += 1
+                self.stats['rows'] += written
+                self.stats['seconds'] += time.perf_counter() - started
+
+    def requeue(self, errors, actions, description):
+        with self.lock:
+            self.stats['failed'] += 1
+            self.pending_errors[:0] = errors + [(datetime.datetime.now().isoformat(), description)]
+            self.pending_actions[:0] = actions
+            overflow = len(self.pending_errors) + len(self.pending_actions) - LOG_MAX_PENDING
+            if overflow > 0:
+                # oldest journal rows go first, then the oldest errors
+                dropped_actions = min(overflow, len(self.pending_actions))
+                del self.pending_actions[:dropped_actions]
+                del self.pending_errors[:overflow - dropped_actions]
+                self.stats['dropped'] += overflow
+
 
 class DatabaseHandler:
+    local = threading.local()
+    log_writers = {}
+    log_writers_lock = threading.Lock()
+
     def __init__(self):
         self.db_file = 'peanut.db'
-        self.create_tables()
+        with DatabaseHandler.log_writers_lock:
+            # the schema is checked once per database file and process, not by every handler
+            if self.db_file not in DatabaseHandler.log_writers:
+                self.create_tables()
+                DatabaseHandler.log_writers[self.db_file] = LogWriter(self.db_file)
+            self.log_writer = DatabaseHandler.log_writers[self.db_file]
+
+    @staticmethod
+    def thread_connection(db_file):
+        # one persistent connection per thread and database file; sqlite3 connections can't be shared across threads
+        connections = getattr(DatabaseHandler.local, 'connections', None)
+        if connections is None:
+            connections = DatabaseHandler.local.connections = {}
+        if db_file not in connections:
+            conn = sqlite3.connect(db_file, timeout=30)
+            # only takes effect on a new database, and only before it switches to WAL: lets compaction free
+            # pages without rewriting the whole file
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            connections[db_file] = conn
+        return connections[db_file]
+
+    def connect(self):
+        return DatabaseHandler.thread_connection(self.db_file)
+
+    def close(self):
+        self.log_writer.flush()
+        connections = getattr(DatabaseHandler.local, 'connections', {})
+        conn = connections.pop(self.db_file, None)
+        if conn is not None:
+            conn.close()
+
+    def flush_logs(self):
+        self.log_writer.flush()
+
+    def get_log_write_stats(self):
+        with self.log_writer.lock:
+            return dict(self.log_writer.stats)
 
     def create_tables(self):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
 
         c.execute('''CREATE TABLE IF NOT EXISTS UserSettings (
@@ -41,6 +247,82 @@ class DatabaseHandler:
                         description TEXT
                      )''')
 
+        # append-only journal of every file operation; timestamps are Unix seconds and action types are ids into
+        # ActionTypes, keeping each row small
+        c.execute('''CREATE TABLE IF NOT EXISTS ActionTypes (
+                        type_id INTEGER PRIMARY KEY,
+                        name TEXT UNIQUE
+                     )''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS ActionLogs (
+                        action_id INTEGER PRIMARY KEY,
+                        timestamp INTEGER,
+                        type_id INTEGER,
+                        success INTEGER,
+                        src_path TEXT,
+                        dst_path TEXT
+                     )''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_actionlogs_timestamp ON ActionLogs (timestamp)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_actionlogs_type ON ActionLogs (type_id, timestamp)''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS FileHashes (
+                        device INTEGER,
+                        inode INTEGER,
+                        size INTEGER,
+                        mtime_ns INTEGER,
+                        path TEXT,
+                        partial_hash TEXT,
+                        full_hash TEXT,
+                        last_used TEXT,
+                        PRIMARY KEY (device, inode, size, mtime_ns)
+                     )''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_filehashes_path ON FileHashes (path)''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS CatalogDirectories (
+                        path TEXT PRIMARY KEY,
+                        mtime_ns INTEGER,
+                        scanned_at_ns INTEGER,
+                        file_count INTEGER,
+                        dir_count INTEGER,
+                        total_size INTEGER
+                     )''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS CatalogEntries (
+                        directory TEXT,
+                        name TEXT,
+                        kind TEXT,
+                        size INTEGER,
+                        atime REAL,
+                        mtime_ns INTEGER,
+                        inode INTEGER,
+                        device INTEGER,
+                        PRIMARY KEY (directory, name)
+                     )''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS RenameBatches (
+                        batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        timestamp TEXT,
+                        description TEXT,
+                        status TEXT
+                     )''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS RenameSteps (
+                        batch_id INTEGER,
+                        step INTEGER,
+                        src_path TEXT,
+                        dst_path TEXT,
+                        PRIMARY KEY (batch_id, step)
+                     )''')
+
+        c.execute('''CREATE TABLE IF NOT EXISTS Metrics (
+                        run_id INTEGER,
+                        timestamp TEXT,
+                        operation TEXT,
+                        name TEXT,
+                        value REAL
+                     )''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_metrics_operation ON Metrics (operation, run_id)''')
+
         c.execute('''CREATE TABLE IF NOT EXISTS CustomFolders (
                         folder_id INTEGER PRIMARY KEY AUTOINCREMENT,
                         folder_path TEXT,
@@ -48,37 +330,33 @@ class DatabaseHandler:
                      )''')
 
         conn.commit()
-        conn.close()
 
     # System Settings
     def load_status(self):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute("SELECT status FROM UserSettings WHERE user_id = 1")
         result = c.fetchone()
-        conn.close()
         return result[0] if result else None
 
     def save_status(self, status):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute("INSERT OR REPLACE INTO UserSettings (user_id, status) VALUES (1, ?)", (status,))
         conn.commit()
-        conn.close()
 
     def get_user_settings(self):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''SELECT status, ui_size, theme FROM UserSettings WHERE user_id = 1''')
         settings = c.fetchone()
-        conn.close()
         if settings:
             return {'status': settings[0], 'ui_size': settings[1], 'theme': settings[2]}
         else:
             return None
 
     def update_user_settings(self, status=None, ui_size=None, theme=None):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
 
         if status is not None:
@@ -88,32 +366,49 @@ class DatabaseHandler:
         if theme is not None:
             c.execute('''UPDATE UserSettings SET theme = ? WHERE user_id = 1''', (theme,))
         conn.commit()
-        conn.close()
+
+    def save_settings(self, user_settings=None, autoclean_settings=None):
+        # whole rows from the SettingsStore, written in one transaction
+        conn = self.connect()
+        with conn:
+            if user_settings is not None:
+                conn.execute('''INSERT OR REPLACE INTO UserSettings (user_id, status, ui_size, theme)
+                                VALUES (1, ?, ?, ?)''',
+                             (user_settings['status'], user_settings['ui_size'], user_settings['theme']))
+            if autoclean_settings is not None:
+                conn.execute('''INSERT OR REPLACE INTO AutoCleanSettings (id, clean_empty_folders_flag,
+                                    clean_unused_files_flag, clean_duplicate_files_flag, clean_recycling_bin_flag,
+                                    clean_browser_history_flag, frequency, next_cleaning_time)
+                                VALUES (1, ?, ?, ?, ?, ?, ?, ?)''',
+                             (autoclean_settings['clean_empty_folders_flag'],
+                              autoclean_settings['clean_unused_files_flag'],
+                              autoclean_settings['clean_duplicate_files_flag'],
+                              autoclean_settings['clean_recycling_bin_flag'],
+                              autoclean_settings['clean_browser_history_flag'],
+                              autoclean_settings['autoclean_frequency'],
+                              autoclean_settings['next_cleaning_time']))
 
     # AutoClean
     def get_clean_frequency(self):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''SELECT frequency FROM AutoCleanSettings WHERE id = 1''')
         result = c.fetchone()
-        conn.close()
         return result[0] if result else None
 
     def update_clean_frequency(self, frequency):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''INSERT OR REPLACE INTO AutoCleanSettings (id, frequency) VALUES (1, ?)''', (frequency,))
         conn.commit()
-        conn.close()
 
     def get_clean_flags(self):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''SELECT clean_empty_folders_flag, clean_unused_files_flag, clean_duplicate_files_flag,
                             clean_recycling_bin_flag, clean_browser_history_flag
                      FROM AutoCleanSettings WHERE id = 1''')
         result = c.fetchone()
-        conn.close()
         return {
             'clean_empty_folders_flag': result[0],
             'clean_unused_files_flag': result[1],
@@ -124,7 +419,7 @@ class DatabaseHandler:
 
     def update_clean_flags(self, clean_empty_folders_flag, clean_unused_files_flag, clean_duplicate_files_flag,
                            clean_recycling_bin_flag, clean_browser_history_flag, autoclean_frequency, next_cleaning_time):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''
             INSERT OR REPLACE INTO AutoCleanSettings (id, clean_empty_folders_flag, clean_unused_files_flag, 
@@ -134,30 +429,26 @@ class DatabaseHandler:
         ''', (clean_empty_folders_flag, clean_unused_files_flag, clean_duplicate_files_flag, clean_recycling_bin_flag,
               clean_browser_history_flag, autoclean_frequency, next_cleaning_time))
         conn.commit()
-        conn.close()
 
     def get_next_cleaning_time(self):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''SELECT next_cleaning_time FROM AutoCleanSettings WHERE id = 1''')
         result = c.fetchone()
-        conn.close()
         return datetime.datetime.fromisoformat(result[0]) if result and result[0] else None
 
     def update_next_cleaning_time(self, next_cleaning_time):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''INSERT OR REPLACE INTO AutoCleanSettings (id, next_cleaning_time) VALUES (1, ?)''',
                   (next_cleaning_time.isoformat(),))
         conn.commit()
-        conn.close()
 
     def get_autoclean_settings(self):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('SELECT * FROM AutoCleanSettings WHERE id = 1')
         row = c.fetchone()
-        conn.close()
         if row:
             return {
                 'clean_empty_folders_flag': row[1],
@@ -170,83 +461,337 @@ class DatabaseHandler:
             }
         return None
 
+    def get_file_hashes(self):
+        conn = self.connect()
+        c = conn.cursor()
+        c.execute('''SELECT device, inode, size, mtime_ns, path, partial_hash, full_hash FROM FileHashes''')
+        rows = c.fetchall()
+        return {(row[0], row[1], row[2], row[3]): {'path': row[4], 'partial': row[5], 'full': row[6]}
+                for row in rows}
+
+    def save_file_hashes(self, hashes):
+        if not hashes:
+            return
+        conn = self.connect()
+        c = conn.cursor()
+        timestamp = datetime.datetime.now().isoformat()
+        # a path only keeps the row for its current (device, inode, size, mtime_ns)
+        c.executemany('''DELETE FROM FileHashes WHERE path = ?''', [(value['path'],) for value in hashes.values()])
+        c.executemany('''INSERT OR REPLACE INTO FileHashes
+                         (device, inode, size, mtime_ns, path, partial_hash, full_hash, last_used)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                      [(key[0], key[1], key[2], key[3], value['path'], value['partial'], value['full'], timestamp)
+                       for key, value in hashes.items()])
+        conn.commit()
+
+    @staticmethod
+    def under(column, root):
+        # SQL condition and parameters for root itself or a path below it; a bare prefix would also match a
+        # sibling such as root + "b"
+        prefix = root if root.endswith(os.sep) else root + os.sep
+        return f'''({column} = ? OR substr({column}, 1, ?) = ?)''', (root, len(prefix), prefix)
+
+    def evict_file_hashes(self, root_directory, seen_paths):
+        # rows under a root that was just scanned but whose path was not seen no longer exist
+        conn = self.connect()
+        c = conn.cursor()
+        condition, parameters = self.under('path', root_directory)
+        c.execute(f'''SELECT DISTINCT path FROM FileHashes WHERE {condition}''', parameters)
+        stale = [(row[0],) for row in c.fetchall() if row[0] not in seen_paths]
+        c.executemany('''DELETE FROM FileHashes WHERE path = ?''', stale)
+        conn.commit()
+        return len(stale)
+
+    def cap_file_hashes(self, max_rows):
+        conn = self.connect()
+        c = conn.cursor()
+        c.execute('''DELETE FROM FileHashes WHERE rowid NOT IN
+                     (SELECT rowid FROM FileHashes ORDER BY last_used DESC LIMIT ?)''', (max_rows,))
+        conn.commit()
+
+    def get_catalog_directories(self, root_directory):
+        conn = self.connect()
+        c = conn.cursor()
+        condition, parameters = self.under('path', root_directory)
+        c.execute(f'''SELECT path, mtime_ns, scanned_at_ns FROM CatalogDirectories WHERE {condition}''', parameters)
+        rows = c.fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def get_catalog_entries(self, root_directory):
+        conn = self.connect()
+        c = conn.cursor()
+        condition, parameters = self.under('directory', root_directory)
+        c.execute(f'''SELECT directory, name, kind, size, atime, mtime_ns, inode, device FROM CatalogEntries
+                      WHERE {condition}''', parameters)
+        entries = {}
+        for row in c:
+            entries.setdefault(row[0], []).append((row[1], row[2], row[3:]))
+        return entries
+
+    def get_catalog_summary(self, root_directory):
+        conn = self.connect()
+        c = conn.cursor()
+        condition, parameters = self.under('path', root_directory)
+        c.execute(f'''SELECT COUNT(*), SUM(file_count), SUM(total_size) FROM CatalogDirectories
+                      WHERE {condition}''', parameters)
+        result = c.fetchone()
+        return {'directories': result[0] or 0, 'files': result[1] or 0, 'total_size': result[2] or 0}
+
+    def save_catalog(self, recorded, forgotten):
+        conn = self.connect()
+        c = conn.cursor()
+        stale = [(directory_path,) for directory_path in list(recorded) + list(forgotten)]
+        c.executemany('''DELETE FROM CatalogEntries WHERE directory = ?''', stale)
+        c.executemany('''DELETE FROM CatalogDirectories WHERE path = ?''', stale)
+        for directory_path, (mtime_ns, scanned_at_ns, rows) in recorded.items():
+            files = [row_stat for _, kind, row_stat in rows if kind == 'file']
+            c.execute('''INSERT INTO CatalogDirectories (path, mtime_ns, scanned_at_ns, file_count, dir_count, total_size)
+                         VALUES (?, ?, ?, ?, ?, ?)''',
+                      (directory_path, mtime_ns, scanned_at_ns, len(files),
+                       sum(1 for _, kind, _ in rows if kind == 'dir'), sum(row_stat[0] for row_stat in files)))
+            c.executemany('''INSERT INTO CatalogEntries (directory, name, kind, size, atime, mtime_ns, inode, device)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                          [(directory_path, name, kind) + tuple(row_stat) for name, kind, row_stat in rows])
+        conn.commit()
+
+    # Metrics: one row per metric, grouped into runs of one operation
+    def save_metrics(self, run_id, operation, metrics):
+        conn = self.connect()
+        c = conn.cursor()
+        timestamp = datetime.datetime.now().isoformat()
+        c.executemany('''INSERT INTO Metrics (run_id, timestamp, operation, name, value) VALUES (?, ?, ?, ?, ?)''',
+                      [(run_id, timestamp, operation, name, value) for name, value in metrics.items()])
+        c.execute('''DELETE FROM Metrics WHERE operation = ? AND run_id NOT IN
+                     (SELECT DISTINCT run_id FROM Metrics WHERE operation = ? ORDER BY run_id DESC LIMIT ?)''',
+                  (operation, operation, METRICS_MAX_RUNS))
+        conn.commit()
+
+    def get_latest_metrics(self):
+        # {operation: {'run_id', 'timestamp', 'metrics': {name: value}}} for the newest run of each operation
+        conn = self.connect()
+        c = conn.cursor()
+        c.execute('''SELECT run_id, timestamp, operation, name, value FROM Metrics
+                     WHERE run_id = (SELECT MAX(run_id) FROM Metrics AS latest WHERE latest.operation = Metrics.operation)
+                     ORDER BY operation, name''')
+        latest = {}
+        for run_id, timestamp, operation, name, value in c:
+            run = latest.setdefault(operation, {'run_id': run_id, 'timestamp': timestamp, 'metrics': {}})
+            run['metrics'][name] = value
+        return latest
+
+    # Rename journal: a batch's steps are written in one transaction before any file is renamed
+    def start_rename_batch(self, description, steps):
+        conn = self.connect()
+        with conn:
+            c = conn.cursor()
+            c.execute('''INSERT INTO RenameBatches (timestamp, description, status) VALUES (?, ?, 'pending')''',
+                      (datetime.datetime.now().isoformat(), description))
+            batch_id = c.lastrowid
+            c.executemany('''INSERT INTO RenameSteps (batch_id, step, src_path, dst_path) VALUES (?, ?, ?, ?)''',
+                          [(batch_id, step, src_path, dst_path) for step, (src_path, dst_path) in enumerate(steps)])
+        return batch_id
+
+    def finish_rename_batch(self, batch_id, status):
+        conn = self.connect()
+        c = conn.cursor()
+        c.execute('''UPDATE RenameBatches SET status = ? WHERE batch_id = ?''', (status, batch_id))
+        conn.commit()
+
+    def get_last_rename_batch(self):
+        # the newest batch that can still be undone, with its steps in the order they were performed
+        conn = self.connect()
+        c = conn.cursor()
+        c.execute('''SELECT batch_id FROM RenameBatches WHERE status IN ('done', 'pending', 'failed')
+                     ORDER BY batch_id DESC LIMIT 1''')
+        result = c.fetchone()
+        if result is None:
+            return None
+        c.execute('''SELECT src_path, dst_path FROM RenameSteps WHERE batch_id = ? ORDER BY step''', (result[0],))
+        return result[0], c.fetchall()
+
+    # MultiSearch filename index; optional because it needs an SQLite build with FTS5
+    def create_search_index_tables(self):
+        conn = self.connect()
+        c = conn.cursor()
+        try:
+            c.execute('''CREATE TABLE IF NOT EXISTS SearchIndexRoots (
+                            root TEXT PRIMARY KEY,
+                            built_at TEXT
+                         )''')
+            c.execute('''CREATE TABLE IF NOT EXISTS SearchIndexDirectories (
+                            path TEXT PRIMARY KEY,
+                            mtime_ns INTEGER,
+                            scanned_at_ns INTEGER
+                         )''')
+            c.execute('''CREATE TABLE IF NOT EXISTS SearchIndexEntries (
+                            entry_id INTEGER PRIMARY KEY,
+                            directory TEXT,
+                            name TEXT,
+                            kind TEXT
+                         )''')
+            c.execute('''CREATE INDEX IF NOT EXISTS idx_searchindexentries_directory
+                         ON SearchIndexEntries (directory)''')
+            c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS SearchIndexNames USING fts5(
+                            name, content='SearchIndexEntries', content_rowid='entry_id',
+                            tokenize='trigram case_sensitive 1'
+                         )''')
+            c.execute('''CREATE TRIGGER IF NOT EXISTS searchindexentries_insert AFTER INSERT ON SearchIndexEntries
+                         BEGIN
+                            INSERT INTO SearchIndexNames (rowid, name) VALUES (new.entry_id, new.name);
+                         END''')
+            c.execute('''CREATE TRIGGER IF NOT EXISTS searchindexentries_delete AFTER DELETE ON SearchIndexEntries
+                         BEGIN
+                            INSERT INTO SearchIndexNames (SearchIndexNames, rowid, name)
+                            VALUES ('delete', old.entry_id, old.name);
+                         END''')
+            conn.commit()
+            return True
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            self.log_error(f"Filename index unavailable: {str(e)}")
+            return False
+
+    def get_search_index_roots(self):
+        conn = self.connect()
+        c = conn.cursor()
+        c.execute('''SELECT root FROM SearchIndexRoots''')
+        return [row[0] for row in c.fetchall()]
+
+    def add_search_index_root(self, root):
+        conn = self.connect()
+        c = conn.cursor()
+        c.execute('''INSERT OR REPLACE INTO SearchIndexRoots (root, built_at) VALUES (?, ?)''',
+                  (root, datetime.datetime.now().isoformat()))
+        conn.commit()
+
+    def get_indexed_directories(self, root):
+        conn = self.connect()
+        c = conn.cursor()
+        condition, parameters = self.under('path', root)
+        c.execute(f'''SELECT path, mtime_ns, scanned_at_ns FROM SearchIndexDirectories WHERE {condition}''', parameters)
+        return {row[0]: (row[1], row[2]) for row in c.fetchall()}
+
+    def get_indexed_subdirectories(self, root):
+        conn = self.connect()
+        c = conn.cursor()
+        condition, parameters = self.under('directory', root)
+        c.execute(f'''SELECT directory, name FROM SearchIndexEntries WHERE kind = 'dir' AND {condition}''', parameters)
+        subdirectories = {}
+        for row in c:
+            subdirectories.setdefault(row[0], []).append(row[1])
+        return subdirectories
+
+    def save_indexed_directories(self, recorded, forgotten):
+        conn = self.connect()
+        c = conn.cursor()
+        stale = [(path,) for path in list(recorded) + list(forgotten)]
+        c.executemany('''DELETE FROM SearchIndexEntries WHERE directory = ?''', stale)
+        c.executemany('''DELETE FROM SearchIndexDirectories WHERE path = ?''', stale)
+        for path, (mtime_ns, scanned_at_ns, entries) in recorded.items():
+            c.execute('''INSERT INTO SearchIndexDirectories (path, mtime_ns, scanned_at_ns) VALUES (?, ?, ?)''',
+                      (path, mtime_ns, scanned_at_ns))
+            c.executemany('''INSERT INTO SearchIndexEntries (directory, name, kind) VALUES (?, ?, ?)''',
+                          [(path, name, kind) for name, kind in entries])
+        conn.commit()
+
+    def search_index(self, name_pattern, directory):
+        # name_pattern is a case-sensitive GLOB, which the trigram tokenizer can answer from the index
+        conn = self.connect()
+        c = conn.cursor()
+        condition, parameters = self.under('e.directory', directory)
+        c.execute(f'''SELECT e.directory, e.name FROM SearchIndexNames
+                      JOIN SearchIndexEntries e ON e.entry_id = SearchIndexNames.rowid
+                      WHERE SearchIndexNames.name GLOB ? AND e.kind = 'file' AND {condition}''',
+                  (name_pattern,) + parameters)
+        return c.fetchall()
+
     def add_redirect(self, keyword, from_directory, to_directory):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''INSERT INTO Redirects (keyword, from_directory, to_directory)
                      VALUES (?, ?, ?)''', (keyword, from_directory, to_directory))
         conn.commit()
-        conn.close()
 
     def get_redirects(self):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''SELECT * FROM Redirects''')
         redirects = c.fetchall()
-        conn.close()
         return redirects
 
     def delete_redirect(self, keyword, from_directory, to_directory):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''DELETE FROM Redirects WHERE keyword = ? AND from_directory = ? AND to_directory = ?''',
                   (keyword, from_directory, to_directory))
         conn.commit()
-        conn.close()
 
     def clear_all_redirects(self):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''DELETE FROM Redirects''')
         conn.commit()
-        conn.close()
 
     def get_custom_folder_path(self, folder_id):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('SELECT folder_path FROM CustomFolders WHERE folder_id = ?', (folder_id,))
         path = c.fetchone()
-        conn.close()
         return path[0] if path else None
 
     def update_custom_folder(self, index, folder_path, folder_name):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''INSERT OR REPLACE INTO CustomFolders (folder_id, folder_path, folder_name) VALUES (?, ?, ?)''',
                   (index, folder_path, folder_name))
         conn.commit()
-        conn.close()
 
     def get_custom_folder_name(self, index):
-        conn = sqlite3.connect(self.db_file)
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''SELECT folder_name FROM CustomFolders WHERE folder_id = ?''', (index,))
         result = c.fetchone()
-        conn.close()
         return result[0] if result else f"Custom folder {index}"
 
     # Error Handling
-    def log_action(self, action_type, src_path, dst_path):
-        conn = sqlite3.connect(self.db_file)
+    def log_action(self, action_type, src_path, dst_path=None, success=True):
+        self.log_writer.add_action((int(time.time()), action_type, int(success), src_path, dst_path))
+
+    def log_actions(self, actions, success=True):
+        # one enqueue for a whole bulk operation; actions is a list of (action_type, src_path, dst_path)
+        timestamp = int(time.time())
+        self.log_writer.add_actions([(timestamp, action_type, int(success), src_path, dst_path)
+                                     for action_type, src_path, dst_path in actions])
+
+    def get_action_logs(self, action_type=None, since=None, limit=100):
+        # newest first; since is a datetime
+        self.log_writer.flush()
+        conn = self.connect()
         c = conn.cursor()
-        timestamp = datetime.datetime.now().isoformat()
-        c.execute('''INSERT INTO ActionLogs (action_type, src_path, dst_path, timestamp)
-                     VALUES (?, ?, ?, ?)''', (action_type, src_path, dst_path, timestamp))
-        conn.commit()
-        conn.close()
+        query = '''SELECT a.timestamp, t.name, a.success, a.src_path, a.dst_path
+                   FROM ActionLogs a JOIN ActionTypes t ON t.type_id = a.type_id WHERE 1 = 1'''
+        parameters = []
+        if action_type is not None:
+            query += ''' AND a.type_id = (SELECT type_id FROM ActionTypes WHERE name = ?)'''
+            parameters.append(action_type)
+        if since is not None:
+            query += ''' AND a.timestamp >= ?'''
+            parameters.append(int(since.timestamp()))
+        query += ''' ORDER BY a.timestamp DESC, a.action_id DESC LIMIT ?'''
+        parameters.append(limit)
+        c.execute(query, parameters)
+        return [{'timestamp': datetime.datetime.fromtimestamp(timestamp), 'action_type': name,
+                 'success': bool(success), 'src_path': src_path, 'dst_path': dst_path}
+                for timestamp, name, success, src_path, dst_path in c.fetchall()]
 
     def log_error(self, description):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
         timestamp = datetime.datetime.now().isoformat()
-        c.execute('''INSERT INTO ErrorLogs (timestamp, description) VALUES (?, ?)''', (timestamp, description))
-        conn.commit()
-        conn.close()
+        self.log_writer.add_error((timestamp, description))
 
     def get_latest_error(self):
-        conn = sqlite3.connect(self.db_file)
+        self.log_writer.flush()
+        conn = self.connect()
         c = conn.cursor()
         c.execute('''SELECT description FROM ErrorLogs ORDER BY error_id DESC LIMIT 1''')
         result = c.fetchone()
-        conn.close()
         return {'description': result[0]} if result else None
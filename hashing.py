@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_ALGORITHMS = ('blake2b', 'sha256', 'md5')
+
+
+class HashingEngine:
+    def __init__(self, algorithm='blake2b', workers=None, buffer_size=1024 * 1024,
+                 max_in_flight_bytes=256 * 1024 * 1024):
+        if algorithm not in HASH_ALGORITHMS:
+            raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.buffer_size = buffer_size
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.in_flight_bytes = 0
+        self.in_flight_condition = threading.Condition()
+        self.local = threading.local()
+        self.stats_lock = threading.Lock()
+        self.errors = []
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {'files': 0, 'bytes': 0, 'worker_seconds': 0.0, 'wall_seconds': 0.0}
+
+    def get_throughput(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        mib = stats['bytes'] / (1024 * 1024)
+        stats['workers'] = self.workers
+        stats['algorithm'] = self.algorithm
+        stats['mib_per_second'] = mib / stats['wall_seconds'] if stats['wall_seconds'] else 0.0
+        stats['mib_per_worker_second'] = mib / stats['worker_seconds'] if stats['worker_seconds'] else 0.0
+        return stats
+
+    def get_buffer(self):
+        # one reusable buffer per worker thread, so reading never allocates per chunk
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            buffer = self.local.buffer = bytearray(self.buffer_size)
+        return buffer
+
+    def hash_file(self, file_path, partial_bytes=None):
+        started = time.perf_counter()
+        buffer = self.get_buffer()
+        view = memoryview(buffer)
+        file_hash = hashlib.new(self.algorithm)
+        read_bytes = 0
+        with open(file_path, "rb", buffering=0) as f:
+            if partial_bytes is None:
+                while True:
+                    n = f.readinto(buffer)
+                    if not n:
+                        break
+                    file_hash.update(view[:n])
+                    read_bytes += n
+            else:
+                # head and tail only; files up to 2 * partial_bytes are read whole
+                size = os.fstat(f.fileno()).st_size
+                read_bytes += self.read_range(f, file_hash, view, partial_bytes)
+                if size > 2 * partial_bytes:
+                    f.seek(-partial_bytes, os.SEEK_END)
+                read_bytes += self.read_range(f, file_hash, view, partial_bytes)
+        with self.stats_lock:
+            self.stats['files'] += 1
+            self.stats['bytes'] += read_bytes
+            self.stats['worker_seconds'] += time.perf_counter() - started
+        return file_hash.hexdigest()
+
+    def read_range(self, f, file_hash, view, length):
+        read_bytes = 0
+        while read_bytes < length:
+            n = f.readinto(view[:min(len(view), length - read_bytes)])
+            if not n:
+                break
+            file_hash.update(view[:n])
+            read_bytes += n
+        return read_bytes
+
+    def hash_files(self, files, partial_bytes=None, on_progress=None, checkpoint=None):
+        # files is a list of (file_path, size); returns {file_path: hash or None}.
+        # on_progress(read_bytes) runs on worker threads as files finish; checkpoint() runs before each
+        # submit and may raise to stop submitting, in which case the files already submitted still finish
+        results = {}
+        self.errors = []
+        if not files:
+            return results
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = []
+            for file_path, size in files:
+                if checkpoint is not None:
+                    checkpoint()
+                read_bytes = size if partial_bytes is None else min(size, 2 * partial_bytes)
+                cost = min(read_bytes, self.max_in_flight_bytes)
+                self.acquire_in_flight(cost)
+                future = executor.submit(self.hash_file, file_path, partial_bytes)
+                future.add_done_callback(lambda _, cost=cost: self.release_in_flight(cost))
+                if on_progress is not None:
+                    future.add_done_callback(lambda _, read_bytes=read_bytes: on_progress(read_bytes))
+                futures.append((file_path, future))
+            for file_path, future in futures:
+                try:
+                    results[file_path] = future.result()
+                except Exception as e:
+                    self.errors.append((file_path, e))
+                    results[file_path] = None
+        with self.stats_lock:
+            self.stats['wall_seconds'] += time.perf_counter() - started
+        return results
+
+    def acquire_in_flight(self, cost):
+        with self.in_flight_condition:
+            while self.in_flight_bytes and self.in_flight_bytes + cost > self.max_in_flight_bytes:
+                self.in_flight_condition.wait()
+            self.in_flight_bytes += cost
+
+    def release_in_flight(self, cost):
+        with self.in_flight_condition:
+            self.in_flight_bytes -= cost
+            self.in_flight_condition.notify_all()
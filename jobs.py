@@ -0,0 +1,151 @@
+import threading
+import time
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class Job:
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self.status = 'queued'
+        self.error = None
+        self.progress = {'files_scanned': 0, 'files_total': 0, 'bytes_hashed': 0, 'bytes_reclaimed': 0}
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.started_at = None
+        self.finished_at = None
+
+    def run(self):
+        self.status = 'running'
+        self.started_at = time.monotonic()
+        try:
+            self.target(self)
+            self.status = 'done'
+        except JobCancelled:
+            self.status = 'cancelled'
+        except Exception as e:
+            self.error = e
+            self.status = 'failed'
+        finally:
+            self.finished_at = time.monotonic()
+
+    # called from the job's own thread between units of work
+    def checkpoint(self):
+        if not self.resume_event.is_set():
+            self.status = 'paused'
+            while not self.resume_event.wait(0.2):
+                if self.cancel_event.is_set():
+                    break
+            if self.status == 'paused':
+                self.status = 'running'
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def update(self, **counters):
+        with self.lock:
+            for key, value in counters.items():
+                self.progress[key] = self.progress.get(key, 0) + value
+
+    def set_total(self, files_total):
+        with self.lock:
+            self.progress['files_total'] = files_total
+
+    # called from the UI thread
+    def cancel(self):
+        self.cancel_event.set()
+        self.resume_event.set()
+
+    def pause(self):
+        self.resume_event.clear()
+
+    def resume(self):
+        self.resume_event.set()
+
+    def is_active(self):
+        return self.status in ('queued', 'running', 'paused')
+
+    def snapshot(self):
+        with self.lock:
+            progress = dict(self.progress)
+        progress['status'] = self.status
+        progress['elapsed_seconds'] = ((self.finished_at or time.monotonic()) - self.started_at
+                                       if self.started_at else 0.0)
+        progress['fraction'] = self.fraction(progress)
+        progress['eta_seconds'] = self.eta_seconds(progress)
+        return progress
+
+    def fraction(self, progress):
+        # None until there is an estimate of the total, e.g. from the previous run's catalog
+        if not progress['files_total']:
+            return None
+        return min(1.0, progress['files_scanned'] / progress['files_total'])
+
+    def eta_seconds(self, progress):
+        fraction = progress['fraction']
+        if not fraction or progress['elapsed_seconds'] <= 0:
+            return None
+        return progress['elapsed_seconds'] * (1 - fraction) / fraction
+
+    def describe(self):
+        progress = self.snapshot()
+        message = f"{self.name} {progress['status']}: {progress['files_scanned']} files scanned"
+        if progress['bytes_hashed']:
+            message += f", {format_bytes(progress['bytes_hashed'])} hashed"
+        if progress['bytes_reclaimed']:
+            message += f", {format_bytes(progress['bytes_reclaimed'])} reclaimed"
+        if progress['eta_seconds'] is not None and progress['status'] == 'running':
+            minutes, seconds = divmod(int(progress['eta_seconds']), 60)
+            message += f", about {minutes}m {seconds}s left"
+        return message
+
+
+class JobRunner:
+    # runs cleans, redirects and bulk MultiSearch operations off the UI thread, one job at a time
+    def __init__(self):
+        self.jobs = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, name, target):
+        job = Job(name, target)
+        with self.lock:
+            self.jobs.append(job)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        return job
+
+    def run(self):
+        while True:
+            with self.lock:
+                queued = [job for job in self.jobs if job.status == 'queued']
+                if not queued:
+                    self.thread = None
+                    return
+            job = queued[0]
+            if job.cancel_event.is_set():
+                job.status = 'cancelled'
+                continue
+            job.run()
+
+    def current_job(self):
+        with self.lock:
+            active = [job for job in self.jobs if job.is_active()]
+        return active[0] if active else None
+
+    def forget_finished(self):
+        with self.lock:
+            self.jobs = [job for job in self.jobs if job.is_active()]
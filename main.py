@@ -1,14 +1,34 @@
+import time
+STARTUP_STARTED = time.perf_counter()
 import datetime
+import itertools
+import queue
+import threading
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog
 from PIL import Image
-import pygame
 import os
 from autoclean import AutoCleanHandler
 from autodirect import AutoDirectHandler
 from multisearch import MultiSearchHandler
 from database import DatabaseHandler
+from jobs import JobRunner
+from metrics import MetricsRecorder
+from settings import SettingsStore
+
+# cold start to first drawn window; a slower start is reported and recorded in the startup metrics
+STARTUP_BUDGET_SECONDS = 2.0
+# every icon is decoded once per process and shared by all the widgets that show it
+image_cache = {}
+
+
+def load_image(path, size=(20, 20)):
+    key = (path, size)
+    if key not in image_cache:
+        image = Image.open(path)
+        image_cache[key] = ctk.CTkImage(light_image=image, dark_image=image, size=size)
+    return image_cache[key]
 
 
 class ToolTip:
@@ -60,6 +80,113 @@ def browse_folder(entry):
         entry.insert(0, folder_selected)
 
 
+class VirtualResultsList(ctk.CTkFrame):
+    # only the rows that fit on screen are real widgets; the selection is one byte per result
+    row_height = 28
+
+    def __init__(self, master, height=260, on_selection_change=None, **kwargs):
+        super().__init__(master, height=height, **kwargs)
+        self.results = []
+        self.selection = bytearray()
+        self.selected_count = 0
+        self.offset = 0
+        self.on_selection_change = on_selection_change
+        self.rows = []
+        self.grid_propagate(False)
+        self.grid_columnconfigure(0, weight=1)
+        self.rows_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.rows_frame.grid(row=0, column=0, sticky="nsew")
+        self.grid_rowconfigure(0, weight=1)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scroll)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.build_rows(max(1, height // self.row_height))
+        self.bind("<Configure>", self.on_resize)
+        for widget in (self, self.rows_frame):
+            widget.bind("<MouseWheel>", self.on_mouse_wheel)
+            widget.bind("<Button-4>", lambda event: self.scroll_to(self.offset - 3))
+            widget.bind("<Button-5>", lambda event: self.scroll_to(self.offset + 3))
+
+    def build_rows(self, count):
+        for row in self.rows:
+            row.destroy()
+        self.rows = []
+        for i in range(count):
+            row = ctk.CTkCheckBox(self.rows_frame, text="", command=lambda i=i: self.toggle_row(i))
+            row.pack(anchor="w", padx=15, pady=2)
+            row.bind("<MouseWheel>", self.on_mouse_wheel)
+            row.bind("<Button-4>", lambda event: self.scroll_to(self.offset - 3))
+            row.bind("<Button-5>", lambda event: self.scroll_to(self.offset + 3))
+            self.rows.append(row)
+        self.render()
+
+    def on_resize(self, event):
+        count = max(1, event.height // self.row_height)
+        if count != len(self.rows):
+            self.build_rows(count)
+
+    def on_mouse_wheel(self, event):
+        self.scroll_to(self.offset - (3 if event.delta > 0 else -3))
+
+    def on_scroll(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(value) * len(self.results)))
+        elif action == "scroll":
+            step = len(self.rows) if unit == "pages" else 1
+            self.scroll_to(self.offset + int(value) * step)
+
+    def scroll_to(self, offset):
+        self.offset = max(0, min(offset, len(self.results) - len(self.rows)))
+        self.render()
+
+    def render(self):
+        for i, row in enumerate(self.rows):
+            index = self.offset + i
+            if index < len(self.results):
+                row.configure(text=self.results[index], state="normal")
+                row.select() if self.selection[index] else row.deselect()
+            else:
+                row.configure(text="", state="disabled")
+                row.deselect()
+        if self.results:
+            self.scrollbar.set(self.offset / len(self.results),
+                               min(1.0, (self.offset + len(self.rows)) / len(self.results)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def toggle_row(self, i):
+        index = self.offset + i
+        if index >= len(self.results):
+            return
+        self.selection[index] ^= 1
+        self.selected_count += 1 if self.selection[index] else -1
+        self.selection_changed()
+
+    def selection_changed(self):
+        if self.on_selection_change is not None:
+            self.on_selection_change(self.selected_count, len(self.results))
+
+    def append(self, paths):
+        self.results.extend(paths)
+        self.selection.extend(bytes(len(paths)))
+        self.render()
+
+    def clear(self):
+        self.results = []
+        self.selection = bytearray()
+        self.selected_count = 0
+        self.offset = 0
+        self.render()
+
+    def select_all(self):
+        self.selection = bytearray(b"\x01") * len(self.results)
+        self.selected_count = len(self.results)
+        self.render()
+        self.selection_changed()
+
+    def get_selected(self):
+        return list(itertools.compress(self.results, self.selection))
+
+
 class App(ctk.CTk):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -69,14 +196,25 @@ class App(ctk.CTk):
         self.title("Peanut Automated File Manager")
         self.iconbitmap("images/peanut.ico")
         self.db_handler = DatabaseHandler()
-        self.tab_view = TabView(master=self, app=self)
-        self.show_progress = False
+        self.settings = SettingsStore.for_database(self.db_handler)
+        self.startup_metrics = MetricsRecorder(self.db_handler, 'startup')
+        self.startup_metrics.add_phase('imports', self.startup_metrics.started - STARTUP_STARTED)
+        self.job_runner = JobRunner()
         self.show_error = False
-        self.tab_view = TabView(master=self, app=self)
-        self.auto_clean_handler = AutoCleanHandler()
-        self.auto_direct_handler = AutoDirectHandler()
-        self.auto_clean_handler.load_settings()
-        self.update_next_cleaning_time_label()
+        # one handler of each kind for the whole window; the tabs share them
+        with self.startup_metrics.phase('handlers'):
+            self.auto_clean_handler = AutoCleanHandler()
+            self.auto_direct_handler = AutoDirectHandler()
+        with self.startup_metrics.phase('settings'):
+            self.load_user_settings()
+        with self.startup_metrics.phase('sidebar'):
+            self.create_sidebar()
+        with self.startup_metrics.phase('tabs'):
+            self.tab_view = TabView(master=self, app=self)
+            self.tab_view.grid(row=0, column=1, padx=20, pady=10, sticky="nsew")
+            self.tab_view.load_redirects()
+        with self.startup_metrics.phase('settings'):
+            self.apply_settings()
         self.user_feedback_frame = ctk.CTkFrame(self)
         self.user_feedback_frame.grid(row=2, column=1, columnspan=2, sticky="nsew", padx=20, pady=(0, 10))
         self.user_feedback_label = ctk.CTkLabel(self.user_feedback_frame, text="", font=("Arial", 8))
@@ -84,39 +222,106 @@ class App(ctk.CTk):
         self.user_feedback_frame.grid_columnconfigure(0, weight=1)
         self.user_feedback_frame.grid_columnconfigure(1, weight=0)
         self.update_user_feedback()
+        self.after_idle(self.report_startup_time)
+
+    def report_startup_time(self):
+        # runs once the first window has been drawn
+        self.update_idletasks()
+        metrics = self.startup_metrics.snapshot()
+        first_window_seconds = time.perf_counter() - STARTUP_STARTED
+        self.startup_metrics.set('first_window_seconds', first_window_seconds)
+        self.startup_metrics.set('over_budget', int(first_window_seconds > STARTUP_BUDGET_SECONDS))
+        phases = ", ".join(f"{name[len('phase_'):-len('_seconds')]} {seconds:.3f} s"
+                           for name, seconds in metrics.items() if name.startswith('phase_'))
+        print(f"Startup: first window in {first_window_seconds:.3f} s ({phases})")
+        if first_window_seconds > STARTUP_BUDGET_SECONDS:
+            print(f"Startup over its {STARTUP_BUDGET_SECONDS:.1f} s budget")
+        self.startup_metrics.finish()
 
     def on_closing(self):
         self.auto_clean_handler.save_settings()
         self.auto_direct_handler.save_settings()
+        self.tab_view.multi_search_handler.stop_search_index_refresh()
         self.destroy()
 
     def update_user_feedback(self):
+        job = self.job_runner.current_job()
         if self.show_error:
             latest_error = self.db_handler.get_latest_error()
             if latest_error:
                 message = f"An error has occurred: {latest_error['description']}"
             else:
                 message = "An error has occurred..."
-        elif self.show_progress:
-            if not hasattr(self, 'bouncing_progress_bar'):
-                self.bouncing_progress_bar = ctk.CTkProgressBar(self.user_feedback_frame, mode="indeterminate",
-                                                                indeterminate_speed=1)
-                self.bouncing_progress_bar.grid(row=0, column=0, sticky="ew", padx=20)
-                self.bouncing_progress_bar.start()
-            message = "AutoClean in progress...."
+        elif job is not None:
+            if not hasattr(self, 'job_progress_bar'):
+                self.job_progress_bar = ctk.CTkProgressBar(self.user_feedback_frame, mode="determinate")
+                self.job_progress_bar.grid(row=0, column=0, sticky="ew", padx=20)
+                self.job_pause_button = ctk.CTkButton(self.user_feedback_frame, text="Pause", width=60,
+                                                      command=self.toggle_pause_job)
+                self.job_pause_button.grid(row=0, column=2, padx=5)
+                self.job_cancel_button = ctk.CTkButton(self.user_feedback_frame, text="Cancel", width=60,
+                                                       command=self.cancel_job)
+                self.job_cancel_button.grid(row=0, column=3, padx=(5, 20))
+            progress = job.snapshot()
+            if progress['fraction'] is None:
+                # no estimate of the total yet (first run), so the bar can only show that work is happening
+                if self.job_progress_bar.cget("mode") != "indeterminate":
+                    self.job_progress_bar.configure(mode="indeterminate")
+                    self.job_progress_bar.start()
+            else:
+                if self.job_progress_bar.cget("mode") != "determinate":
+                    self.job_progress_bar.stop()
+                    self.job_progress_bar.configure(mode="determinate")
+                self.job_progress_bar.set(progress['fraction'])
+            self.job_pause_button.configure(text="Resume" if progress['status'] == 'paused' else "Pause")
+            message = job.describe()
         else:
             message = ""
-            if hasattr(self, 'bouncing_progress_bar'):
-                self.bouncing_progress_bar.grid_forget()
-                del self.bouncing_progress_bar
+        if job is None and hasattr(self, 'job_progress_bar'):
+            for widget in (self.job_progress_bar, self.job_pause_button, self.job_cancel_button):
+                widget.grid_forget()
+            del self.job_progress_bar, self.job_pause_button, self.job_cancel_button
         self.user_feedback_label.configure(text=message)
 
-    def update_next_cleaning_time_label(self):
-        next_cleaning_time = self.auto_clean_handler.get_next_cleaning_time()
-        self.tab_view.ac_next_cleaning_label.configure(text=f"Next Clean in\n\n{next_cleaning_time}")
-        self.tab_view.ac_next_cleaning_label.after(600000, self.update_next_cleaning_time_label)  # Update every 10 minutes
-        self.db_handler = DatabaseHandler()
-        settings = self.db_handler.get_user_settings()
+    # Background jobs: long operations run on the job runner's thread and are polled from the Tk thread
+    def start_job(self, name, target, on_done=None):
+        self.show_error = False
+        job = self.job_runner.submit(name, target)
+        self.update_user_feedback()
+        self.after(200, self.poll_job, job, on_done)
+        return job
+
+    def poll_job(self, job, on_done):
+        if job.is_active():
+            self.update_user_feedback()
+            self.after(200, self.poll_job, job, on_done)
+            return
+        if job.status == 'failed':
+            self.db_handler.log_error(f"{job.name} failed: {str(job.error)}")
+            self.show_error = True
+        self.job_runner.forget_finished()
+        self.update_user_feedback()
+        if on_done is not None:
+            on_done(job)
+
+    def toggle_pause_job(self):
+        job = self.job_runner.current_job()
+        if job is None:
+            return
+        if job.resume_event.is_set():
+            job.pause()
+        else:
+            job.resume()
+        self.update_user_feedback()
+
+    def cancel_job(self):
+        job = self.job_runner.current_job()
+        if job is not None:
+            job.cancel()
+        self.update_user_feedback()
+
+    def load_user_settings(self):
+        settings = self.settings.get_user_settings()
         if settings:
             self.user_status = settings['status']
             self.ui_size = settings['ui_size']
@@ -125,14 +330,9 @@ class App(ctk.CTk):
             self.user_status = 0
             self.ui_size = 100
             self.theme = 'system'
-        self.create_sidebar()
-        self.tab_view = TabView(master=self, app=self)
-        self.tab_view.grid(row=0, column=1, padx=20, pady=10, sticky="nsew")
-        self.apply_settings()
-        self.tab_view.load_redirects()
 
     def load_settings(self):
-        settings = self.db_handler.get_autoclean_settings()
+        settings = self.settings.get_autoclean_settings()
         if settings:
             self.clean_empty_folders_flag = settings['clean_empty_folders_flag']
             self.clean_unused_files_flag = settings['clean_unused_files_flag']
@@ -157,11 +357,13 @@ class App(ctk.CTk):
         self.create_sidebar_theme_scaling()
 
     def create_sidebar_buttons(self):
-        pygame.mixer.init()
-        self.peanut_logo_image = ctk.CTkImage(light_image=Image.open("images/peanut.ico"),
-                                              dark_image=Image.open("images/peanut.ico"))
+        self.peanut_logo_image = load_image("images/peanut.ico")
         def play_eee_sound():
             try:
+                # pygame takes a noticeable part of startup, so it is only loaded the first time the sound plays
+                import pygame
+                if not pygame.mixer.get_init():
+                    pygame.mixer.init()
                 pygame.mixer.music.load("images/eee.wav")
                 pygame.mixer.music.play()
             except Exception as e:
@@ -176,15 +378,14 @@ class App(ctk.CTk):
         create_tooltip(self.help_button, "Open the FAQ page.")
 
     def load_saved_status(self):
-        status = self.db_handler.load_status()
+        status = self.settings.get('status')
         return status != "running"
 
     def on_closing(self):
         self.destroy()
 
     def create_sidebar_theme_scaling(self):
-        self.theme_label_image = ctk.CTkImage(light_image=Image.open("images/13125625.png"),
-                                              dark_image=Image.open("images/13125625.png"))
+        self.theme_label_image = load_image("images/13125625.png")
         self.theme_label = ctk.CTkLabel(self.sidebar_frame, image=self.theme_label_image, text="")
         self.theme_label.grid(row=5, column=0, padx=20, pady=(10, 0), sticky="ew")
         self.theme_menu = ctk.CTkOptionMenu(self.sidebar_frame, values=["System", "Light", "Dark"],
@@ -192,8 +393,7 @@ class App(ctk.CTk):
         self.theme_menu.set(self.theme)
         self.theme_menu.grid(row=6, column=0, padx=20, pady=(10, 10), sticky="ew")
 
-        self.scaling_label_image = ctk.CTkImage(light_image=Image.open("images/4606575.png"),
-                                                dark_image=Image.open("images/4606575.png"))
+        self.scaling_label_image = load_image("images/4606575.png")
         self.scaling_label = ctk.CTkLabel(self.sidebar_frame, image=self.scaling_label_image, text="")
         self.scaling_label.grid(row=7, column=0, padx=20, pady=(5, 0), sticky="ew")
         self.scaling_menu_var = ctk.StringVar(value=f"{self.ui_size}%")
@@ -203,7 +403,7 @@ class App(ctk.CTk):
         self.scaling_menu.grid(row=8, column=0, padx=20, pady=(5, 20), sticky="ew")
 
     def apply_settings(self):
-        settings = self.db_handler.get_user_settings()
+        settings = self.settings.get_user_settings()
         ctk.set_appearance_mode(f"{self.theme}")
         if settings:
             self.change_scaling_event(f"{settings['ui_size'] or 100}%")
@@ -211,7 +411,7 @@ class App(ctk.CTk):
             self.change_scaling_event("100%")
 
     def change_theme_event(self, new_appearance_mode: str):
-        self.db_handler.update_user_settings(theme=new_appearance_mode)
+        self.settings.update(theme=new_appearance_mode)
         ctk.set_appearance_mode(new_appearance_mode)
 
     def change_scaling_event(self, new_scaling: str):
@@ -219,7 +419,7 @@ class App(ctk.CTk):
             new_scaling = "100%"
         else:
             new_scaling_float = int(new_scaling.replace("%", "")) / 100
-            self.db_handler.update_user_settings(ui_size=int(new_scaling.replace("%", "")))
+            self.settings.update(ui_size=int(new_scaling.replace("%", "")))
             ctk.set_widget_scaling(new_scaling_float)
             new_width = int(self.original_width * new_scaling_float)
             new_height = int(self.original_height * new_scaling_float)
@@ -292,8 +492,7 @@ class App(ctk.CTk):
             directory_entry.grid(row=i + 3, column=1, padx=10, pady=5)
             favorite_folders_list.append(directory_entry)
 
-            browse_button_image = ctk.CTkImage(light_image=Image.open("images/3240447.png"),
-                                               dark_image=Image.open("images/3240447.png"))
+            browse_button_image = load_image("images/3240447.png")
             browse_button = ctk.CTkButton(setup_info_popup, image=browse_button_image, text="", width=20,
                                           command=lambda entry=directory_entry: browse_folder(entry))
             browse_button.grid(row=i + 3, column=2, padx=10, pady=5, sticky="w")
@@ -322,10 +521,16 @@ class TabView(ctk.CTkTabview):
         self.ac_next_cleaning_label = None
         self.next_cleaning_time = None
         self.db_handler = DatabaseHandler()
-        self.auto_clean_handler = AutoCleanHandler()
-        self.auto_direct_handler = AutoDirectHandler()
+        self.auto_clean_handler = app.auto_clean_handler
+        self.auto_direct_handler = app.auto_direct_handler
         self.multi_search_handler = MultiSearchHandler()
+        self.multi_search_handler.start_search_index_refresh()
+        self.settings = app.settings
         self.app = app
+        self.search_cancel_event = None
+        self.search_queue = None
+        self.search_hits = 0
+        self.search_from_index = False
         self.add("AutoClean")
         self.add("AutoDirect")
         self.add("MultiSearch")
@@ -387,8 +592,7 @@ class TabView(ctk.CTkTabview):
                                                   command=self.remove_all_redirects)
         self.ad_remove_all_button.grid(row=0, column=1, padx=(5, 5), pady=(10, 5), sticky="e")
 
-        self.ad_add_button_image = ctk.CTkImage(light_image=Image.open("images/plus_1104323.png"),
-                                                dark_image=Image.open("images/plus_1104323.png"))
+        self.ad_add_button_image = load_image("images/plus_1104323.png")
         self.ad_add_button = ctk.CTkButton(self.ad_button_frame, text="", image=self.ad_add_button_image, width=20,
                                            command=self.add_redirect)
         self.ad_add_button.grid(row=0, column=2, padx=(5, 10), pady=(10, 5), sticky="e")
@@ -398,24 +602,23 @@ class TabView(ctk.CTkTabview):
         self.ms_frame.grid(row=1, column=1, sticky="nsew", padx=0, pady=3)  # Removed side padding
         self.ms_directory_entry = ctk.CTkEntry(self.ms_frame, placeholder_text="folder", width=220)
         self.ms_directory_entry.pack(side="left", padx=5, pady=1)
-        self.ms_browse_button_image = ctk.CTkImage(light_image=Image.open("images/3240447.png"),
-                                                   dark_image=Image.open("images/3240447.png"))
+        self.ms_browse_button_image = load_image("images/3240447.png")
         self.ad_browse_button = ctk.CTkButton(self.ms_frame, image=self.ms_browse_button_image, text="", width=20,
                                               command=lambda: browse_folder(self.ms_directory_entry))
         self.ad_browse_button.pack(side="left", padx=(2, 10))
         self.ms_keyword_entry = ctk.CTkEntry(self.ms_frame, placeholder_text="search  (or ' . ' for all files)",
                                              width=220)
         self.ms_keyword_entry.pack(side="left", padx=5, pady=1)
-        self.ms_search_button_image = ctk.CTkImage(light_image=Image.open("images/7270638.png"),
-                                                   dark_image=Image.open("images/7270638.png"))
+        self.ms_search_button_image = load_image("images/7270638.png")
         self.ms_search_button = ctk.CTkButton(self.ms_frame, text="", image=self.ms_search_button_image,
                                               command=self.perform_search, width=20)
         self.ms_search_button.pack(side="left", padx=3)
+        self.ms_cancel_button = ctk.CTkButton(self.ms_frame, text="cancel", width=20, command=self.cancel_search)
+        self.ms_cancel_button.pack(side="left", padx=3)
 
-        self.search_results_frame = ctk.CTkScrollableFrame(master=self.tab("MultiSearch"), height=260)
-        self.search_results_frame.grid(row=3, column=1, sticky="nsew", padx=0, pady=1)
-        self.search_results_frame.grid_rowconfigure(0, weight=1)
-        self.search_results_frame.grid_columnconfigure(0, weight=1)
+        self.search_results_list = VirtualResultsList(master=self.tab("MultiSearch"), height=260,
+                                                      on_selection_change=self.update_selection_status)
+        self.search_results_list.grid(row=3, column=1, sticky="nsew", padx=0, pady=1)
 
         self.ms_button_frame = ctk.CTkFrame(master=self.tab("MultiSearch"))
         self.ms_button_frame.grid(row=4, column=1, sticky="nsew", padx=0, pady=1)
@@ -423,24 +626,27 @@ class TabView(ctk.CTkTabview):
         self.ms_select_all_button = ctk.CTkButton(self.ms_button_frame, text="select all", width=20,
                                                   command=self.select_all_files)
         self.ms_select_all_button.pack(side="left", padx=5, pady=1)
+        self.ms_search_status_label = ctk.CTkLabel(self.ms_button_frame, text="", font=("Arial", 10))
+        self.ms_search_status_label.pack(side="left", padx=5, pady=1)
 
-        self.ms_rename_button_image = ctk.CTkImage(light_image=Image.open("images/pencil.png"),
-                                                   dark_image=Image.open("images/pencil.png"))
+        self.ms_rename_button_image = load_image("images/pencil.png")
         self.ms_rename_button = ctk.CTkButton(self.ms_button_frame, text="", image=self.ms_rename_button_image,
                                               width=20, command=self.open_ms_rename_popup)
         self.ms_rename_button.pack(side="right", padx=5, pady=5)
         create_tooltip(self.ms_rename_button,
                        "(1) Find and replace, (2) Convert file formats, or (3) Add a prefix or suffix to the filenames")
+        self.ms_undo_rename_button = ctk.CTkButton(self.ms_button_frame, text="undo rename", width=20,
+                                                   command=self.undo_rename)
+        self.ms_undo_rename_button.pack(side="right", padx=5, pady=5)
+        create_tooltip(self.ms_undo_rename_button, "Undo the last batch rename.")
 
-        self.ms_copy_button_image = ctk.CTkImage(light_image=Image.open("images/11092355.png"),
-                                                 dark_image=Image.open("images/11092355.png"))
+        self.ms_copy_button_image = load_image("images/11092355.png")
         self.ms_copy_button = ctk.CTkButton(self.ms_button_frame, text="", image=self.ms_copy_button_image, width=20,
                                             command=self.open_ms_copy_popup)
         self.ms_copy_button.pack(side="right", padx=5, pady=5)
         create_tooltip(self.ms_copy_button, "Copy all selected items into a new folder.")
 
-        self.ms_delete_button_image = ctk.CTkImage(light_image=Image.open("images/delete.png"),
-                                                   dark_image=Image.open("images/delete.png"))
+        self.ms_delete_button_image = load_image("images/delete.png")
         self.ms_delete_button = ctk.CTkButton(self.ms_button_frame, text="", image=self.ms_delete_button_image,
                                               width=20, command=self.open_ms_delete_popup)
         self.ms_delete_button.pack(side="right", padx=5, pady=5)
@@ -449,7 +655,7 @@ class TabView(ctk.CTkTabview):
     ''' AutoClean Functions '''
 
     def load_autoclean_settings(self):
-        settings = self.db_handler.get_autoclean_settings()
+        settings = self.settings.get_autoclean_settings()
         if settings:
             self.ac_folders_switch.select() if settings[
                                                    'clean_empty_folders_flag'] == 1 else self.ac_folders_switch.deselect()
@@ -479,44 +685,32 @@ class TabView(ctk.CTkTabview):
 
     def set_clean_frequency(self, frequency):
         self.auto_clean_handler.set_clean_frequency(frequency)
-        next_cleaning_time = self.auto_clean_handler.next_cleaning_time
-        self.db_handler.update_clean_flags(
-            autoclean_frequency=frequency,
-            clean_empty_folders_flag=self.ac_folders_switch.get(),
-            clean_unused_files_flag=self.ac_unused_files_switch.get(),
-            clean_duplicate_files_flag=self.ac_duplicate_files_switch.get(),
-            clean_recycling_bin_flag=self.ac_recycling_switch.get(),
-            clean_browser_history_flag=self.ac_browser_history_switch.get(),
-            next_cleaning_time=next_cleaning_time.isoformat() if next_cleaning_time else None
-        )
-        self.update_next_cleaning_time_label()
+        self.show_next_cleaning_time()
 
-    def update_next_cleaning_time_label(self):
+    def show_next_cleaning_time(self):
         next_cleaning_time = self.auto_clean_handler.get_next_cleaning_time()
         self.ac_next_cleaning_label.configure(text=f"Next Clean in\n\n{next_cleaning_time}")
+
+    def update_next_cleaning_time_label(self):
+        self.show_next_cleaning_time()
         self.ac_next_cleaning_label.after(60000, self.update_next_cleaning_time_label)  # Update every minute
 
     def clean_now(self):
-        self.show_progress = True
-        self.app.update_user_feedback()
-        self.auto_clean_handler.activate_selected_AC(force=True)
-        self.show_progress = False
-        self.app.update_user_feedback()
-        self.update_next_cleaning_time_label()
+        self.clean_now_button.configure(state="disabled")
+        self.app.start_job("AutoClean",
+                           lambda job: self.auto_clean_handler.activate_selected_AC(force=True, job=job),
+                           on_done=self.on_clean_now_done)
+
+    def on_clean_now_done(self, job):
+        # runs on the Tk thread once the job has finished, after the clean has moved the next cleaning time;
+        # scheduled cleans show up with the label's minute refresh
+        self.clean_now_button.configure(state="normal")
+        self.show_next_cleaning_time()
 
     def toggle_autoclean_feature(self, feature_name, value):
         try:
             setattr(self.auto_clean_handler, feature_name, value)
             self.auto_clean_handler.save_settings()
-            self.db_handler.update_clean_flags(
-                autoclean_frequency=self.auto_clean_handler.frequency,
-                clean_empty_folders_flag=self.auto_clean_handler.clean_empty_folders_flag,
-                clean_unused_files_flag=self.auto_clean_handler.clean_unused_files_flag,
-                clean_duplicate_files_flag=self.auto_clean_handler.clean_duplicate_files_flag,
-                clean_recycling_bin_flag=self.auto_clean_handler.clean_recycling_bin_flag,
-                clean_browser_history_flag=self.auto_clean_handler.clean_browser_history_flag,
-                next_cleaning_time=self.auto_clean_handler.next_cleaning_time
-            )
         except Exception as e:
             print(f"Failed to toggle {feature_name}: {e}")
 
@@ -583,8 +777,7 @@ class TabView(ctk.CTkTabview):
         ad_to_dir_entry.bind("<FocusIn>", lambda event: self.clear_placeholder(event, "to this folder"))
         ad_to_dir_entry.bind("<FocusOut>", lambda event: self.set_placeholder(event, "to this folder"))
 
-        ad_browse_button_image = ctk.CTkImage(light_image=Image.open("images/3240447.png"),
-                                              dark_image=Image.open("images/3240447.png"))
+        ad_browse_button_image = load_image("images/3240447.png")
         ad_browse_button = ctk.CTkButton(new_frame, image=ad_browse_button_image, text="", width=20,
                                          command=lambda: browse_folder(ad_to_dir_entry))
         ad_browse_button.pack(side="left", padx=4)
@@ -623,8 +816,7 @@ class TabView(ctk.CTkTabview):
             folder_entry.insert(0, folder_path if folder_path else "")
             folder_entries.append(folder_entry)
 
-            browse_button_image = ctk.CTkImage(light_image=Image.open("images/3240447.png"),
-                                               dark_image=Image.open("images/3240447.png"))
+            browse_button_image = load_image("images/3240447.png")
             browse_button = ctk.CTkButton(custom_folders_popup, image=browse_button_image, text="", width=20,
                                           command=lambda entry=folder_entry: browse_folder(entry))
             browse_button.grid(row=i, column=2, padx=5, pady=10)
@@ -701,27 +893,75 @@ class TabView(ctk.CTkTabview):
             to_directory = entry[2].get().strip()
             if keyword and from_directory and to_directory:
                 self.db_handler.add_redirect(keyword, from_directory, to_directory)
+        self.app.start_job("AutoDirect", lambda job: self.auto_direct_handler.update_redirects(job=job))
 
     ''' MultiSearch Functions '''
 
     def perform_search(self):
+        # the walk runs on a worker thread and hands results to the Tk thread in batches through a queue
+        self.cancel_search()
         self.clear_search_results()
         directory = self.ms_directory_entry.get()
         keyword = self.ms_keyword_entry.get()
         if keyword:
-            files_found = self.multi_search_handler.multi_search_for_files(keyword, directory)
-            for file in files_found:
-                result_checkbox = ctk.CTkCheckBox(self.search_results_frame, text=file)
-                result_checkbox.pack(anchor="w", padx=15, pady=5)
+            self.search_hits = 0
+            self.search_from_index = self.multi_search_handler.is_indexed(directory)
+            self.search_cancel_event = threading.Event()
+            self.search_queue = queue.Queue()
+            threading.Thread(target=self.run_search,
+                             args=(keyword, directory, self.search_cancel_event, self.search_queue),
+                             daemon=True).start()
+            self.ms_search_status_label.configure(text="searching...")
+            self.after(50, self.poll_search_results, self.search_queue)
+
+    def run_search(self, keyword, directory, cancel_event, results_queue):
+        try:
+            for batch, files_scanned in self.multi_search_handler.iter_search_results(keyword, directory,
+                                                                                        cancel_event):
+                results_queue.put((batch, files_scanned))
+        except Exception as e:
+            self.multi_search_handler.db_handler.log_error(f"Error searching {directory}: {str(e)}")
+        results_queue.put(None)
+
+    def poll_search_results(self, results_queue):
+        # a newer search has replaced this one; its queue is simply abandoned
+        if results_queue is not self.search_queue:
+            return
+        files_scanned = None
+        for _ in range(20):
+            try:
+                item = results_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.search_queue = None
+                # the index is refreshed in the background, so it can miss the last few seconds of changes
+                stale_note = " (from the index, may be a few seconds out of date)" if self.search_from_index else ""
+                self.ms_search_status_label.configure(text=f"{self.search_hits} found{stale_note}")
+                return
+            batch, files_scanned = item
+            self.search_results_list.append(batch)
+            self.search_hits += len(batch)
+        if files_scanned is not None:
+            self.ms_search_status_label.configure(text=f"{self.search_hits} found, {files_scanned} files scanned")
+        self.after(50, self.poll_search_results, results_queue)
+
+    def cancel_search(self):
+        if self.search_cancel_event is not None:
+            self.search_cancel_event.set()
+            self.search_cancel_event = None
+        if self.search_queue is not None:
+            self.search_queue = None
+            self.ms_search_status_label.configure(text=f"cancelled, {self.search_hits} found")
 
     def select_all_files(self):
-        for widget in self.search_results_frame.winfo_children():
-            if isinstance(widget, ctk.CTkCheckBox):
-                widget.select()
+        self.search_results_list.select_all()
 
     def clear_search_results(self):
-        for widget in self.search_results_frame.winfo_children():
-            widget.destroy()
+        self.search_results_list.clear()
+
+    def update_selection_status(self, selected_count, result_count):
+        self.ms_search_status_label.configure(text=f"{selected_count} of {result_count} selected")
 
     def open_ms_delete_popup(self):
         selected_files = self.get_selected_files()
@@ -735,8 +975,7 @@ class TabView(ctk.CTkTabview):
         ms_delete_popup.resizable(False, False)
         ms_delete_popup.grab_set()
 
-        ms_warning_image = ctk.CTkImage(light_image=Image.open("images/4096970.png"),
-                                        dark_image=Image.open("images/4096970.png"), size=(50, 50))
+        ms_warning_image = load_image("images/4096970.png", size=(50, 50))
         ms_warning_image_label = ctk.CTkLabel(ms_delete_popup, image=ms_warning_image, text="")
         ms_warning_image_label.pack(side="top")
         ms_warning_label = ctk.CTkLabel(ms_delete_popup, text="Are you sure?\n\nThis action cannot be undone.")
@@ -748,9 +987,9 @@ class TabView(ctk.CTkTabview):
         ms_no_button.pack(side="right", padx=5)
 
     def confirm_delete(self, popup, files):
-        self.multi_search_handler.multi_delete_files(files)
         popup.destroy()
-        self.perform_search()
+        self.app.start_job("Delete", lambda job: self.multi_search_handler.multi_delete_files(files, job=job),
+                           on_done=lambda job: self.perform_search())
 
     def open_ms_copy_popup(self):
         selected_files = self.get_selected_files()
@@ -764,8 +1003,7 @@ class TabView(ctk.CTkTabview):
         ms_copy_popup.resizable(False, False)
         ms_copy_popup.grab_set()
 
-        ms_name_file_image = ctk.CTkImage(light_image=Image.open("images/5762171.png"),
-                                          dark_image=Image.open("images/5762171.png"), size=(50, 50))
+        ms_name_file_image = load_image("images/5762171.png", size=(50, 50))
         ms_name_file_label = ctk.CTkLabel(ms_copy_popup, image=ms_name_file_image, text="")
         ms_name_file_label.pack(side="top", pady=10)
         ms_name_file_entry = ctk.CTkEntry(ms_copy_popup, placeholder_text="Name new folder", width=200)
@@ -784,8 +1022,8 @@ class TabView(ctk.CTkTabview):
         downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
         new_folder = os.path.join(downloads_path, folder_name)
 
-        self.multi_search_handler.multi_copy_files(files, new_folder)
         popup.destroy()
+        self.app.start_job("Copy", lambda job: self.multi_search_handler.multi_copy_files(files, new_folder, job=job))
 
     def open_ms_rename_popup(self):
         selected_files = self.get_selected_files()
@@ -799,8 +1037,7 @@ class TabView(ctk.CTkTabview):
         ms_rename_popup.resizable(False, False)
         ms_rename_popup.grab_set()
 
-        ms_warning_image = ctk.CTkImage(light_image=Image.open("images/caution.png"),
-                                        dark_image=Image.open("images/caution.png"), size=(50, 50))
+        ms_warning_image = load_image("images/caution.png", size=(50, 50))
         ms_warning_image_label = ctk.CTkLabel(ms_rename_popup, image=ms_warning_image, text="")
         ms_warning_image_label.pack(side="top")
         ms_warning_label = ctk.CTkLabel(ms_rename_popup, text="Enter words for Renaming")
@@ -819,16 +1056,18 @@ class TabView(ctk.CTkTabview):
 
     def confirm_rename(self, popup, files, find_pattern, replace_pattern):
         if find_pattern and replace_pattern:
-            self.multi_search_handler.multi_rename_files(files, find_pattern, replace_pattern)
             popup.destroy()
-            self.perform_search()
+            self.app.start_job("Rename",
+                               lambda job: self.multi_search_handler.multi_rename_files(files, find_pattern,
+                                                                                        replace_pattern, job=job),
+                               on_done=lambda job: self.perform_search())
+
+    def undo_rename(self):
+        self.app.start_job("Undo rename", lambda job: self.multi_search_handler.undo_last_rename(),
+                           on_done=lambda job: self.perform_search())
 
     def get_selected_files(self):
-        selected_files = []
-        for widget in self.search_results_frame.winfo_children():
-            if isinstance(widget, ctk.CTkCheckBox) and widget.get() == 1:
-                selected_files.append(widget.cget("text"))
-        return selected_files
+        return self.search_results_list.get_selected()
 
 
 def main():
@@ -0,0 +1,75 @@
+import datetime
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+
+def fingerprint(file_stat, reason):
+    # what must still match for a planned deletion to go ahead. A folder's mtime changes as the files planned
+    # inside it are removed, so only its identity is kept; an unused file must also not have been read since
+    if reason == 'empty_folder':
+        return {'dev': file_stat.st_dev, 'ino': file_stat.st_ino}
+    result = {'dev': file_stat.st_dev, 'ino': file_stat.st_ino, 'size': file_stat.st_size,
+              'mtime_ns': file_stat.st_mtime_ns}
+    if reason == 'unused':
+        result['atime_ns'] = file_stat.st_atime_ns
+    if not file_stat.st_ino:
+        # a stat without an identity (scandir on Windows) would never match a real one, so the rest must do
+        del result['dev'], result['ino']
+    return result
+
+
+def matches_fingerprint(file_stat, expected):
+    current = fingerprint(file_stat, 'unused')
+    return all(current.get(name) == value for name, value in expected.items())
+
+
+class ManifestWriter:
+    # Streams planned deletions to an NDJSON file as the scan finds them: a header line, then one object per
+    # entry with path, size, reason and fingerprint (duplicates also name the copy that is kept). The file only
+    # appears under its final name once the plan is complete
+    def __init__(self, path, roots, options):
+        self.path = path
+        self.temp_path = f"{path}.tmp"
+        self.entries = 0
+        self.bytes = 0
+        self.file = open(self.temp_path, 'w', encoding='utf-8')
+        self.write({'manifest': MANIFEST_VERSION, 'created': datetime.datetime.now().isoformat(),
+                    'roots': roots, 'options': options})
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def add(self, path, file_stat, reason, original=None, original_stat=None):
+        entry = {'path': path, 'size': file_stat.st_size if reason != 'empty_folder' else 0, 'reason': reason,
+                 'fingerprint': fingerprint(file_stat, reason)}
+        if original is not None:
+            entry['original'] = original
+            entry['original_fingerprint'] = fingerprint(original_stat, reason)
+        self.write(entry)
+        self.entries += 1
+        self.bytes += entry['size']
+
+    def close(self, complete=True):
+        self.file.close()
+        if complete:
+            os.replace(self.temp_path, self.path)
+        else:
+            os.remove(self.temp_path)
+
+
+def read_manifest(path):
+    # yields the entries of a manifest one at a time, so applying it never holds the whole plan in memory
+    with open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline() or 'null')
+        if not isinstance(header, dict) or header.get('manifest') != MANIFEST_VERSION:
+            raise ValueError(f"{path} is not an AutoClean manifest")
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def count_entries(path):
+    with open(path, encoding='utf-8') as f:
+        return max(0, sum(1 for line in f if line.strip()) - 1)
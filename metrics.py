@@ -0,0 +1,96 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+class MetricsRecorder:
+    # Collects counters and per-phase timings for one run of an operation and stores them in the Metrics
+    # table when the run finishes. Phases named db_* are the run's own database writes
+    def __init__(self, db_handler, operation):
+        self.db_handler = db_handler
+        self.operation = operation
+        self.counters = {}
+        self.phases = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.log_write_stats = db_handler.get_log_write_stats()
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self.lock:
+            self.counters[name] = value
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+
+    def snapshot(self):
+        with self.lock:
+            metrics = dict(self.counters)
+            phases = dict(self.phases)
+        seconds = time.perf_counter() - self.started
+        metrics['seconds'] = seconds
+        for name, phase_seconds in phases.items():
+            metrics[f'phase_{name}_seconds'] = phase_seconds
+        metrics['db_write_seconds'] = sum(phase_seconds for name, phase_seconds in phases.items()
+                                          if name.startswith('db_'))
+        # log rows are written behind, so this is the flush time of whatever was flushed during the run
+        log_write_stats = self.db_handler.get_log_write_stats()
+        metrics['log_flush_seconds'] = log_write_stats['seconds'] - self.log_write_stats['seconds']
+        metrics['log_rows_written'] = log_write_stats['rows'] - self.log_write_stats['rows']
+        if 'files_scanned' in metrics:
+            metrics['files_per_second'] = metrics['files_scanned'] / seconds if seconds else 0.0
+        return metrics
+
+    def finish(self):
+        metrics = self.snapshot()
+        try:
+            self.db_handler.save_metrics(time.time_ns(), self.operation, metrics)
+        except Exception as e:
+            self.db_handler.log_error(f"Error saving {self.operation} metrics: {str(e)}")
+        return metrics
+
+
+def export_json(db_handler, path):
+    write_atomically(path, json.dumps(db_handler.get_latest_metrics(), indent=2, sort_keys=True))
+
+
+def export_prometheus(db_handler, path):
+    # text exposition format, e.g. for node_exporter's textfile collector
+    lines = []
+    samples = {}
+    for operation, run in db_handler.get_latest_metrics().items():
+        for name, value in run['metrics'].items():
+            samples.setdefault(metric_name(name), []).append((operation, value))
+        samples.setdefault('peanut_last_run_timestamp_seconds', []).append((operation, run['run_id'] / 1e9))
+    for name in sorted(samples):
+        lines.append(f"# TYPE {name} gauge")
+        for operation, value in samples[name]:
+            lines.append(f'{name}{{operation="{operation}"}} {value}')
+    write_atomically(path, "\n".join(lines) + "\n")
+
+
+def metric_name(name):
+    return 'peanut_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def write_atomically(path, text):
+    # a scraper never sees a half-written file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(text)
+    os.replace(temp_path, path)
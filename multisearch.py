@@ -1,11 +1,18 @@
 import os
-import shutil
+from copying import CopyEngine
 from database import DatabaseHandler
+from metrics import MetricsRecorder
+from renaming import RenamePlanner
+from search_index import FilenameIndex
+from traversal import walk_entries
 
 class MultiSearchHandler:
     def __init__(self):
         self.db_handler = DatabaseHandler()
         self.found_files = []
+        self.filename_index = None
+        self.copy_engine = CopyEngine()
+        self.copy_stats = {}
         # file extensions that are valid for batch renaming
         self.valid_extensions = [
             ".txt", ".doc", ".docx", ".rtf", ".odt", ".pdf",  # Document formats
@@ -17,61 +24,187 @@ class MultiSearchHandler:
             ".py", ".java", ".c", ".cpp", ".h", ".html", ".css", ".js", ".php", ".xml",  # Programming/scripting formats
             ".zip", ".rar", ".tar.gz", ".7z",  # Archive formats
             ".exe", ".app", ".bat", ".sh"]  # Executable formats
+        self.load_search_index()
 
-    def multi_search_for_files(self, keyword, directory):
+    def load_search_index(self):
+        # an index enabled in an earlier session is used again as soon as the handler exists
+        try:
+            filename_index = FilenameIndex(self.db_handler)
+        except Exception as e:
+            self.db_handler.log_error(f"Error loading the filename index: {str(e)}")
+            return
+        if filename_index.roots:
+            self.filename_index = filename_index
+
+    def enable_search_index(self, roots):
+        # builds (or incrementally refreshes) the on-disk filename index over the given roots
+        if self.filename_index is None:
+            self.filename_index = FilenameIndex(self.db_handler)
+        watching = self.filename_index.refresh_thread is not None
+        if watching:
+            self.filename_index.stop_watching()
+        for root in roots:
+            try:
+                self.filename_index.add_root(root)
+            except Exception as e:
+                self.db_handler.log_error(f"Error indexing {root}: {str(e)}")
+        if watching:
+            # new roots are watched too
+            self.filename_index.start_watching()
+        return self.filename_index.available
+
+    def refresh_search_index(self):
+        if self.filename_index is not None:
+            self.filename_index.refresh()
+
+    def start_search_index_refresh(self):
+        # for long-running processes (the GUI, the daemon): keeps the index current in the background
+        if self.filename_index is not None:
+            self.filename_index.start_watching()
+
+    def stop_search_index_refresh(self):
+        if self.filename_index is not None:
+            self.filename_index.stop_watching()
+
+    def is_indexed(self, directory):
+        # a search of this directory is answered from the index, which may lag a few seconds behind the disk
+        # (or further, when nothing is refreshing it in the background)
+        return self.filename_index is not None and self.filename_index.covers(directory)
+
+    def multi_search_for_files(self, keyword, directory, prefix=False):
         self.found_files = []
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if keyword in file:
-                    self.found_files.append(os.path.join(root, file))
+        for batch, _ in self.iter_search_results(keyword, directory, prefix=prefix):
+            self.found_files.extend(batch)
         return self.found_files
 
+    def iter_search_results(self, keyword, directory, cancel_event=None, prefix=False, batch_size=200):
+        # yields (batch of matching paths, files scanned so far); stops as soon as cancel_event is set
+        metrics = MetricsRecorder(self.db_handler, 'multisearch')
+        try:
+            if self.is_indexed(directory):
+                try:
+                    # straight from the index, with no walk or stat
+                    with metrics.phase('index_search'):
+                        found_files = self.filename_index.search(keyword, directory, prefix)
+                except Exception as e:
+                    self.db_handler.log_error(f"Filename index search failed, searching the disk instead: {str(e)}")
+                else:
+                    metrics.set('index_used', 1)
+                    metrics.set('results', len(found_files))
+                    for i in range(0, len(found_files), batch_size):
+                        if cancel_event is not None and cancel_event.is_set():
+                            return
+                        yield found_files[i:i + batch_size], min(i + batch_size, len(found_files))
+                    return
+
+            # paths outside every indexed root fall back to a live walk
+            metrics.set('index_used', 0)
+            batch = []
+            files_scanned = 0
+            for _, entries, _ in walk_entries(directory, cancel_event=cancel_event):
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            continue
+                    except OSError:
+                        pass
+                    files_scanned += 1
+                    if entry.name.startswith(keyword) if prefix else keyword in entry.name:
+                        batch.append(entry.path)
+                metrics.set('files_scanned', files_scanned)
+                if len(batch) >= batch_size:
+                    metrics.count('results', len(batch))
+                    yield batch, files_scanned
+                    batch = []
+            metrics.count('results', len(batch))
+            yield batch, files_scanned
+        finally:
+            metrics.finish()
+
     def get_root_directories(self):
         if os.name == 'nt':  # Windows
             return [f"{chr(d)}:\\" for d in range(ord('A'), ord('Z') + 1) if os.path.exists(f"{chr(d)}:\\")]
         else:  # Unix-based (Linux, macOS)
             return ['/']
 
-    def multi_delete_files(self, files):
+    def start_bulk_job(self, job, files):
+        if job is not None:
+            job.set_total(len(files))
+
+    def advance_bulk_job(self, job, **counters):
+        # called before each file, so a paused job stops between files and a cancelled one stops cleanly
+        if job is not None:
+            job.checkpoint()
+            job.update(files_scanned=1, **counters)
+
+    def multi_delete_files(self, files, job=None):
+        self.start_bulk_job(job, files)
         for file in files:
             try:
+                self.advance_bulk_job(job, bytes_reclaimed=os.path.getsize(file) if job is not None else 0)
                 os.remove(file)
-                self.db_handler.log_action('Delete', file, 'File deleted successfully')
+                self.db_handler.log_action('Delete', file)
             except FileNotFoundError:
-                self.db_handler.log_action('Delete', file, 'File not found', success=False)
+                self.db_handler.log_action('Delete', file, success=False)
 
-    def multi_copy_files(self, files, new_folder):
-        for file in files:
-            try:
-                os.makedirs(new_folder, exist_ok=True)
-                shutil.copy(file, new_folder)
-                self.db_handler.log_action('Copy', file, f'File copied to {new_folder}')
-            except FileNotFoundError:
-                self.db_handler.log_action('Copy', file, 'File not found', success=False)
-            except shutil.Error as e:
-                self.db_handler.log_action('Copy', file, str(e), success=False)
+    def multi_copy_files(self, files, new_folder, job=None):
+        self.start_bulk_job(job, files)
+        actions = []
 
-    def multi_rename_files(self, files, find_pattern, replace_pattern):
+        def record(file, dst_path, copied_bytes, error):
+            if job is not None:
+                job.update(files_scanned=1)
+            if error is None:
+                actions.append(('Copy', file, dst_path))
+                return
+            # the journal records that the copy failed, the error log why
+            self.db_handler.log_action('Copy', file, dst_path, success=False)
+            if isinstance(error, FileNotFoundError):
+                self.db_handler.log_error(f"Error copying {file}: File not found")
+            else:
+                self.db_handler.log_error(f"Error copying {file}: {str(error)}")
+
+        self.copy_engine.reset_stats()
+        metrics = MetricsRecorder(self.db_handler, 'multicopy')
         try:
-            for file in files:
-                file_extension = os.path.splitext(file)[1]
-                if file_extension.lower() in self.valid_extensions:
-                    directory, filename = os.path.split(file)
-                    filename_without_ext, ext = os.path.splitext(filename)
-
-                    if find_pattern == '+':
-                        new_filename = f"{replace_pattern}{filename_without_ext}{ext}"
-                    elif find_pattern == '-':
-                        new_filename = f"{filename_without_ext}{replace_pattern}{ext}"
-                    else:
-                        new_filename = filename.replace(find_pattern, replace_pattern)
-
-                    new_path = os.path.join(directory, new_filename)
-
-                    if os.path.exists(file):
-                        os.rename(file, new_path)
-                        self.db_handler.log_action('Rename', file, f'File renamed to {new_path}')
-                else:
-                    self.db_handler.log_action('Rename', file, f"Invalid file extension: {file_extension}. File skipped.", success=False)
-        except Exception as e:
-            self.db_handler.log_action('Rename', file, str(e), success=False)
+            self.copy_engine.copy_files(files, new_folder, on_result=record,
+                                        checkpoint=job.checkpoint if job is not None else None)
+        finally:
+            self.db_handler.log_actions(actions)
+            self.copy_stats = self.copy_engine.get_throughput()
+            for name in ('files', 'bytes', 'errors', 'mib_per_second', 'files_per_second', 'workers'):
+                metrics.set(name, self.copy_stats[name])
+            for method, count in self.copy_stats['methods'].items():
+                metrics.set(f'{method}_files', count)
+            metrics.finish()
+        print(f"Copied {self.copy_stats['files']} files ({self.copy_stats['bytes']} bytes) "
+              f"at {self.copy_stats['mib_per_second']:.1f} MiB/s, {self.copy_stats['files_per_second']:.0f} files/s "
+              f"on {self.copy_stats['workers']} workers")
+
+    def multi_rename_files(self, files, find_pattern, replace_pattern, job=None):
+        # the whole batch is planned and collision-checked first, then renamed all-or-nothing
+        planner = RenamePlanner(self.db_handler, self.valid_extensions)
+        metrics = MetricsRecorder(self.db_handler, 'multirename')
+        with metrics.phase('plan'):
+            steps, skipped = planner.plan(files, find_pattern, replace_pattern)
+        metrics.set('files_skipped', len(skipped))
+        for file, reason in skipped:
+            self.db_handler.log_error(f"Rename skipped for {file}: {reason}")
+        self.start_bulk_job(job, steps)
+        checkpoint = (lambda: self.advance_bulk_job(job)) if job is not None else None
+        try:
+            with metrics.phase('rename'):
+                batch_id = planner.execute(steps, f"{find_pattern} -> {replace_pattern}", checkpoint)
+        except OSError:
+            # already logged, and every file renamed so far has been renamed back
+            metrics.set('rolled_back', 1)
+            return
+        finally:
+            metrics.set('rename_steps', len(steps))
+            metrics.finish()
+        if batch_id is not None:
+            self.db_handler.log_actions([('Rename', src_path, dst_path)
+                                         for src_path, dst_path in planner.renames(steps)])
+
+    def undo_last_rename(self):
+        return RenamePlanner(self.db_handler, self.valid_extensions).undo_last()
@@ -0,0 +1,176 @@
+import argparse
+import sys
+
+# Headless entry point: python -m peanut <command>. Handlers are imported inside each command, and nothing
+# here imports the GUI stack (customtkinter, tkinter, Pillow, pygame), so it runs on machines without a display.
+
+
+def run_clean(args):
+    from autoclean import AutoCleanHandler
+    from jobs import Job
+    handler = AutoCleanHandler()
+    flags = {'empty_folders': args.empty_folders, 'unused_files': args.unused_files,
+             'duplicate_files': args.duplicate_files}
+    if args.plan:
+        if not any(flags.values()):
+            # plan what the saved settings would clean
+            flags = {'empty_folders': bool(handler.clean_empty_folders_flag),
+                     'unused_files': bool(handler.clean_unused_files_flag),
+                     'duplicate_files': bool(handler.clean_duplicate_files_flag)}
+        directories = args.directories or handler.get_default_directories()
+        target = lambda job: handler.plan_directories(directories, args.plan, job=job, **flags)
+    elif any(flags.values()) or args.directories:
+        directories = args.directories or handler.get_default_directories()
+        target = lambda job: handler.clean_directories(directories, job=job, **flags)
+    else:
+        # no options: the same clean as the Clean Now button, with the saved settings
+        target = lambda job: handler.activate_selected_AC(force=True, job=job)
+    # the scan's metadata is kept so other policies can be previewed without walking again
+    handler.keep_snapshots = args.preview_unused is not None
+    job = Job("AutoClean", target)
+    job.run()
+    print(job.describe())
+    if job.status == 'failed':
+        print(f"AutoClean failed: {job.error}", file=sys.stderr)
+        return 1
+    if args.preview_unused is not None:
+        from snapshot import UnusedFilePolicy
+        preview = handler.preview_unused_files(UnusedFilePolicy(min_age_days=args.preview_unused))
+        print(f"Files not accessed for {args.preview_unused} days: {preview['files']} ({preview['bytes']} bytes)")
+        for path in preview['paths']:
+            print(f"  {path}")
+    return 0
+
+
+def run_apply(args):
+    from autoclean import AutoCleanHandler
+    from jobs import Job
+    handler = AutoCleanHandler()
+    job = Job("AutoClean apply", lambda job: handler.apply_manifest(args.manifest, job=job))
+    job.run()
+    print(job.describe())
+    if job.status == 'failed':
+        print(f"Applying {args.manifest} failed: {job.error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_redirect(args):
+    from autodirect import AutoDirectHandler
+    handler = AutoDirectHandler(use_watchdog=False)
+    handler.check_all_sources()
+    handler.wait_for_moves()
+    handler.db_handler.flush_logs()
+    return 0
+
+
+def run_search(args):
+    from multisearch import MultiSearchHandler
+    handler = MultiSearchHandler()
+    if args.index and not handler.enable_search_index([args.directory]):
+        print("This SQLite build has no FTS5; searching the disk instead", file=sys.stderr)
+    if not args.index and handler.is_indexed(args.directory):
+        print("Answered from the filename index, which may be out of date unless `peanut daemon` is running; "
+              "search with --index to refresh it first", file=sys.stderr)
+    found = 0
+    for batch, _ in handler.iter_search_results(args.keyword, args.directory, prefix=args.prefix):
+        for path in batch:
+            print(path)
+        found += len(batch)
+    return 0 if found else 1
+
+
+def run_metrics(args):
+    from database import DatabaseHandler
+    import metrics
+    db_handler = DatabaseHandler()
+    if args.prometheus:
+        metrics.export_prometheus(db_handler, args.prometheus)
+    if args.json:
+        metrics.export_json(db_handler, args.json)
+    if not args.prometheus and not args.json:
+        import json
+        print(json.dumps(db_handler.get_latest_metrics(), indent=2, sort_keys=True))
+    return 0
+
+
+def run_daemon(args):
+    import signal
+    import threading
+    from autoclean import AutoCleanHandler
+    from autodirect import AutoDirectHandler
+    from multisearch import MultiSearchHandler
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    auto_clean_handler = AutoCleanHandler()
+    auto_direct_handler = AutoDirectHandler(use_watchdog=not args.poll)
+    # a clean that fell due while nothing was running happens now rather than at the next 05:00
+    auto_clean_handler.run_auto_cleaning()
+    auto_clean_handler.resume_operations()
+    # keeps the filename index current, so searches answered from it are too
+    multi_search_handler = MultiSearchHandler()
+    multi_search_handler.start_search_index_refresh()
+    print("Peanut daemon running; stop with Ctrl+C or SIGTERM")
+    try:
+        while not stop_event.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    auto_clean_handler.pause_operations()
+    auto_direct_handler.pause_operations()
+    multi_search_handler.stop_search_index_refresh()
+    auto_direct_handler.wait_for_moves()
+    auto_direct_handler.db_handler.flush_logs()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='peanut', description="Peanut Automated File Manager, without the GUI.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    clean_parser = commands.add_parser('clean', help="run AutoClean once")
+    clean_parser.add_argument('directories', nargs='*',
+                              help="folders to clean (default: Desktop, Downloads and the temp folder)")
+    clean_parser.add_argument('--empty-folders', action='store_true')
+    clean_parser.add_argument('--unused-files', action='store_true')
+    clean_parser.add_argument('--duplicate-files', action='store_true')
+    clean_parser.add_argument('--plan', metavar='MANIFEST',
+                              help="delete nothing; write what would be deleted to an NDJSON manifest")
+    clean_parser.add_argument('--preview-unused', metavar='DAYS', type=int,
+                              help="afterwards, list what remains that has not been accessed for DAYS days")
+    clean_parser.set_defaults(run=run_clean)
+
+    apply_parser = commands.add_parser('apply', help="delete what a clean --plan manifest lists, without rescanning")
+    apply_parser.add_argument('manifest')
+    apply_parser.set_defaults(run=run_apply)
+
+    redirect_parser = commands.add_parser('redirect', help="apply every AutoDirect rule once")
+    redirect_parser.set_defaults(run=run_redirect)
+
+    search_parser = commands.add_parser('search', help="print files whose names contain a keyword")
+    search_parser.add_argument('keyword')
+    search_parser.add_argument('directory')
+    search_parser.add_argument('--prefix', action='store_true', help="match the start of the name only")
+    search_parser.add_argument('--index', action='store_true',
+                               help="index the directory, or refresh its index, before searching; later searches "
+                                    "inside it are answered from the index, which `peanut daemon` keeps current")
+    search_parser.set_defaults(run=run_search)
+
+    metrics_parser = commands.add_parser('metrics', help="export the latest metrics of each operation")
+    metrics_parser.add_argument('--prometheus', metavar='PATH')
+    metrics_parser.add_argument('--json', metavar='PATH')
+    metrics_parser.set_defaults(run=run_metrics)
+
+    daemon_parser = commands.add_parser('daemon', help="keep running scheduled cleans and AutoDirect rules, and "
+                                                       "keep the filename index current")
+    daemon_parser.add_argument('--poll', action='store_true',
+                               help="rescan source folders every 10 minutes instead of watching them")
+    daemon_parser.set_defaults(run=run_daemon)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
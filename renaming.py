@@ -0,0 +1,157 @@
+import os
+from collections import deque
+from jobs import JobCancelled
+
+
+class RenamePlanner:
+    def __init__(self, db_handler, valid_extensions):
+        self.db_handler = db_handler
+        self.valid_extensions = valid_extensions
+
+    def key(self, path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def new_name(self, filename, find_pattern, replace_pattern):
+        filename_without_ext, ext = os.path.splitext(filename)
+        if find_pattern == '+':
+            return f"{replace_pattern}{filename_without_ext}{ext}"
+        elif find_pattern == '-':
+            return f"{filename_without_ext}{replace_pattern}{ext}"
+        return filename.replace(find_pattern, replace_pattern)
+
+    def plan(self, files, find_pattern, replace_pattern):
+        # Returns (steps, skipped): steps is the ordered list of (src_path, dst_path) renames to perform and
+        # skipped is a list of (file, reason). The whole batch is checked before anything is renamed
+        skipped = []
+        moves = {}
+        targets = {}
+        for file in files:
+            file_extension = os.path.splitext(file)[1]
+            if file_extension.lower() not in self.valid_extensions:
+                skipped.append((file, f"Invalid file extension: {file_extension}. File skipped."))
+                continue
+            if self.key(file) in moves:
+                continue
+            if not os.path.exists(file):
+                skipped.append((file, "File not found"))
+                continue
+            directory, filename = os.path.split(file)
+            new_path = os.path.join(directory, self.new_name(filename, find_pattern, replace_pattern))
+            if new_path == file:
+                continue
+            moves[self.key(file)] = (file, new_path)
+            targets.setdefault(self.key(new_path), []).append(self.key(file))
+
+        # two files renamed to the same name would overwrite each other, so neither is renamed
+        for sources in targets.values():
+            if len(sources) > 1:
+                for source in sources:
+                    file, new_path = moves.pop(source)
+                    skipped.append((file, f"Collides with another rename to {new_path}"))
+
+        # a target may already exist as long as it is itself renamed away in this batch; a skipped rename can
+        # block another, so this repeats until nothing changes
+        while True:
+            blocked = [source for source, (file, new_path) in moves.items()
+                       if self.key(new_path) != source and self.key(new_path) not in moves
+                       and os.path.lexists(new_path)]
+            if not blocked:
+                break
+            for source in blocked:
+                file, new_path = moves.pop(source)
+                skipped.append((file, f"{new_path} already exists"))
+        return self.order(moves), skipped
+
+    def order(self, moves):
+        # a rename runs once its target has been vacated; renames that form a cycle are broken by moving one
+        # member to a temporary name first
+        pending = dict(moves)
+        waiting_on = {self.key(new_path): source for source, (_, new_path) in pending.items()
+                      if self.key(new_path) in pending and self.key(new_path) != source}
+        ready = deque(source for source, (_, new_path) in pending.items()
+                      if self.key(new_path) not in pending or self.key(new_path) == source)
+        steps = []
+        while pending:
+            if not ready:
+                source = next(iter(pending))
+                file, new_path = pending[source]
+                temp_path = self.temp_path(file, moves)
+                steps.append((file, temp_path))
+                del pending[source]
+                pending[self.key(temp_path)] = (temp_path, new_path)
+                waiting_on[self.key(new_path)] = self.key(temp_path)
+                if source in waiting_on:
+                    ready.append(waiting_on.pop(source))
+                continue
+            source = ready.popleft()
+            file, new_path = pending.pop(source)
+            steps.append((file, new_path))
+            if source in waiting_on:
+                ready.append(waiting_on.pop(source))
+        return steps
+
+    def renames(self, steps):
+        # (original path, final path) for each file, collapsing hops through temporary names
+        renamed = {}
+        for src_path, dst_path in steps:
+            original_path, _ = renamed.pop(self.key(src_path), (src_path, None))
+            renamed[self.key(dst_path)] = (original_path, dst_path)
+        return list(renamed.values())
+
+    def temp_path(self, file, moves):
+        base, ext = os.path.splitext(file)
+        i = 1
+        while os.path.lexists(f"{base}.renaming-{i}{ext}") or self.key(f"{base}.renaming-{i}{ext}") in moves:
+            i += 1
+        return f"{base}.renaming-{i}{ext}"
+
+    def execute(self, steps, description, checkpoint=None):
+        # The plan is journaled in one transaction before any file is touched, so an interrupted batch can
+        # still be undone. A failure part way rolls back the renames already done, leaving no partial set
+        if not steps:
+            return None
+        batch_id = self.db_handler.start_rename_batch(description, steps)
+        done = 0
+        try:
+            for src_path, dst_path in steps:
+                if checkpoint is not None:
+                    checkpoint()
+                os.rename(src_path, dst_path)
+                done += 1
+        except (OSError, JobCancelled) as e:
+            _, failed = self.rollback(steps[:done])
+            self.db_handler.finish_rename_batch(batch_id, 'rolled_back' if not failed else 'failed')
+            if not isinstance(e, JobCancelled):
+                self.db_handler.log_error(f"Error renaming {steps[done][0]}, batch rolled back: {str(e)}")
+            raise
+        self.db_handler.finish_rename_batch(batch_id, 'done')
+        return batch_id
+
+    def rollback(self, steps):
+        # each step is checked against the disk as it is reversed, so steps that never ran are left alone
+        failed = 0
+        restored = 0
+        for src_path, dst_path in reversed(steps):
+            # a rename that only changes case leaves both names pointing at the file on case-insensitive disks
+            case_only = self.key(src_path) == self.key(dst_path)
+            if not case_only and (not os.path.lexists(dst_path) or os.path.lexists(src_path)):
+                continue
+            try:
+                os.rename(dst_path, src_path)
+            except OSError as e:
+                failed += 1
+                self.db_handler.log_error(f"Error undoing rename of {src_path}: {str(e)}")
+            else:
+                restored += 1
+        return restored, failed
+
+    def undo_last(self):
+        # undoes the most recent batch that was not already undone or rolled back, including one that was
+        # interrupted before it finished; returns the number of files restored
+        batch = self.db_handler.get_last_rename_batch()
+        if batch is None:
+            return 0
+        batch_id, steps = batch
+        restored, failed = self.rollback(steps)
+        self.db_handler.finish_rename_batch(batch_id, 'undone' if not failed else 'failed')
+        return restored
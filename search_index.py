@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from catalog import CATALOG_RACY_NS, CatalogEntry
+from traversal import walk_entries
+
+# changed directories are refreshed this long after the first change, so a burst of changes is one refresh
+INDEX_SETTLE_SECONDS = 2.0
+# every root is checked again this often, for changes the observer missed (network drives, a lost event)
+INDEX_REFRESH_SECONDS = 15 * 60
+
+
+class IndexEventHandler:
+    # like RedirectEventHandler, only dispatch() is called, so watchdog is imported only once watching starts
+    def __init__(self, filename_index):
+        self.filename_index = filename_index
+
+    def dispatch(self, event):
+        # creating, deleting or renaming anything changes the listing of the directory it is in
+        if event.event_type in ('created', 'deleted', 'moved'):
+            self.filename_index.mark_changed(os.path.dirname(event.src_path))
+            if event.event_type == 'moved':
+                self.filename_index.mark_changed(os.path.dirname(event.dest_path))
+
+
+class FilenameIndex:
+    def __init__(self, db_handler):
+        self.db_handler = db_handler
+        self.available = db_handler.create_search_index_tables()
+        self.roots = db_handler.get_search_index_roots() if self.available else []
+        self.stats = {'directories_scanned': 0, 'directories_reused': 0}
+        self.indexed = {}
+        self.subdirectories = {}
+        self.recorded = {}
+        self.lock = threading.Lock()
+        # one refresh at a time. Searches never refresh: the index is kept up to date in the background by
+        # start_watching, so a search only reads it
+        self.refresh_lock = threading.Lock()
+        self.changed_directories = set()
+        self.changed_event = threading.Event()
+        self.stop_watching_event = threading.Event()
+        self.observer = None
+        self.refresh_thread = None
+
+    def normalize(self, directory):
+        return os.path.normcase(os.path.abspath(directory))
+
+    def covers(self, directory):
+        if not self.available or not directory:
+            return False
+        directory = self.normalize(directory)
+        return any(self.is_inside(directory, root) for root in self.roots)
+
+    def is_inside(self, path, directory):
+        try:
+            return os.path.commonpath([path, directory]) == directory
+        except ValueError:
+            return False
+
+    def add_root(self, root):
+        if not self.available:
+            return
+        root = self.normalize(root)
+        if root not in self.roots:
+            self.db_handler.add_search_index_root(root)
+            self.roots.append(root)
+        self.refresh_root(root)
+
+    def refresh(self, cancel_event=None):
+        for root in self.roots:
+            self.refresh_root(root, cancel_event)
+
+    def refresh_directory(self, directory, cancel_event=None):
+        # brings the index up to date for one indexed directory and everything below it
+        if self.covers(directory):
+            self.refresh_root(self.normalize(directory), cancel_event)
+
+    def refresh_root(self, root, cancel_event=None):
+        with self.refresh_lock:
+            self.refresh_tree(root, cancel_event)
+
+    def start_watching(self):
+        if not self.available or self.refresh_thread is not None:
+            return
+        self.stop_watching_event = threading.Event()
+        roots = [root for root in self.roots if os.path.isdir(root)]
+        if roots:
+            from watchdog.observers import Observer
+            self.observer = Observer()
+            event_handler = IndexEventHandler(self)
+            for root in roots:
+                self.observer.schedule(event_handler, root, recursive=True)
+            self.observer.daemon = True
+            self.observer.start()
+        self.refresh_thread = threading.Thread(target=self.refresh_in_background, args=(self.stop_watching_event,),
+                                               daemon=True)
+        self.refresh_thread.start()
+
+    def stop_watching(self):
+        self.stop_watching_event.set()
+        self.changed_event.set()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+        if self.refresh_thread is not None:
+            self.refresh_thread.join()
+            self.refresh_thread = None
+
+    def mark_changed(self, directory):
+        # runs on the observer thread
+        with self.lock:
+            self.changed_directories.add(self.normalize(directory))
+        self.changed_event.set()
+
+    def refresh_in_background(self, stop_event):
+        # a full pass when watching starts catches up with changes made while nothing was watching; after that
+        # only directories the observer reported are refreshed, plus a full pass every INDEX_REFRESH_SECONDS
+        changed = False
+        while not stop_event.is_set():
+            try:
+                if changed:
+                    with self.lock:
+                        directories, self.changed_directories = self.changed_directories, set()
+                    refreshed = None
+                    for directory in sorted(directories):
+                        # a directory below one just refreshed was refreshed with it
+                        if refreshed is None or not self.is_inside(directory, refreshed):
+                            self.refresh_directory(directory, stop_event)
+                            refreshed = directory
+                else:
+                    self.refresh(stop_event)
+            except Exception as e:
+                self.db_handler.log_error(f"Error refreshing the filename index: {str(e)}")
+            changed = self.changed_event.wait(INDEX_REFRESH_SECONDS)
+            if changed:
+                stop_event.wait(INDEX_SETTLE_SECONDS)
+                self.changed_event.clear()
+
+    def refresh_tree(self, root, cancel_event=None):
+        # only directories whose mtime changed are listed again; the rest reuse their indexed subdirectories
+        self.stats = {'directories_scanned': 0, 'directories_reused': 0}
+        self.indexed = self.db_handler.get_indexed_directories(root)
+        self.subdirectories = self.db_handler.get_indexed_subdirectories(root)
+        self.recorded = {}
+        visited = set()
+        for directory_path, _, _ in walk_entries(root, lister=self.list_directory, cancel_event=cancel_event):
+            visited.add(directory_path)
+        if cancel_event is not None and cancel_event.is_set():
+            # an unfinished walk would forget every directory it did not reach
+            return
+        forgotten = [directory_path for directory_path in self.indexed if directory_path not in visited]
+        self.db_handler.save_indexed_directories(self.recorded, forgotten)
+
+    def list_directory(self, directory_path):
+        # runs on traversal worker threads
+        directory_stat = os.stat(directory_path)
+        cached = self.indexed.get(directory_path)
+        if cached and cached[0] == directory_stat.st_mtime_ns and directory_stat.st_mtime_ns < cached[1] - CATALOG_RACY_NS:
+            with self.lock:
+                self.stats['directories_reused'] += 1
+            return [CatalogEntry(directory_path, name, 'dir', None) for name in self.subdirectories.get(directory_path, [])]
+        with os.scandir(directory_path) as it:
+            entries = list(it)
+        rows = [(entry.name, self.entry_kind(entry)) for entry in entries]
+        with self.lock:
+            self.stats['directories_scanned'] += 1
+            self.recorded[directory_path] = (directory_stat.st_mtime_ns, time.time_ns(), rows)
+        return entries
+
+    def entry_kind(self, entry):
+        # same split as os.walk: symlinked directories are not files, but are not descended into either
+        if entry.is_dir(follow_symlinks=False):
+            return 'dir'
+        try:
+            return 'dirlink' if entry.is_dir() else 'file'
+        except OSError:
+            return 'file'
+
+    def search(self, keyword, directory, prefix=False):
+        pattern = ''.join(f'[{char}]' if char in '[*?' else char for char in keyword)
+        pattern = f'{pattern}*' if prefix else f'*{pattern}*'
+        directory = self.normalize(directory)
+        return [os.path.join(file_directory, name)
+                for file_directory, name in self.db_handler.search_index(pattern, directory)
+                if self.is_inside(file_directory, directory)]
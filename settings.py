@@ -0,0 +1,111 @@
+import atexit
+import threading
+import time
+
+# changes made within this many seconds of each other are written together in one transaction
+SETTINGS_WRITE_DELAY = 0.5
+
+USER_SETTINGS = ('status', 'ui_size', 'theme')
+AUTOCLEAN_SETTINGS = ('clean_empty_folders_flag', 'clean_unused_files_flag', 'clean_duplicate_files_flag',
+                      'clean_recycling_bin_flag', 'clean_browser_history_flag', 'autoclean_frequency',
+                      'next_cleaning_time')
+
+
+class SettingsStore:
+    # In-memory copy of the UserSettings and AutoCleanSettings rows, shared by every handler on the same database.
+    # Reads never touch SQLite; changes are written behind, and subscribers are told what changed
+    stores = {}
+    stores_lock = threading.Lock()
+
+    @staticmethod
+    def for_database(db_handler):
+        with SettingsStore.stores_lock:
+            if db_handler.db_file not in SettingsStore.stores:
+                SettingsStore.stores[db_handler.db_file] = SettingsStore(db_handler)
+            return SettingsStore.stores[db_handler.db_file]
+
+    def __init__(self, db_handler):
+        self.db_handler = db_handler
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.subscribers = []
+        self.values = dict.fromkeys(USER_SETTINGS + AUTOCLEAN_SETTINGS)
+        self.values.update(db_handler.get_user_settings() or {})
+        self.values.update(db_handler.get_autoclean_settings() or {})
+        self.dirty = set()
+        self.last_change = 0.0
+        self.dirty_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def get(self, name, default=None):
+        with self.lock:
+            value = self.values[name]
+        return default if value is None else value
+
+    def get_user_settings(self):
+        return self.get_group(USER_SETTINGS)
+
+    def get_autoclean_settings(self):
+        return self.get_group(AUTOCLEAN_SETTINGS)
+
+    def get_group(self, names):
+        # None when the row was never saved, like the DatabaseHandler getters
+        with self.lock:
+            group = {name: self.values[name] for name in names}
+        return group if any(value is not None for value in group.values()) else None
+
+    def update(self, **settings):
+        with self.lock:
+            changes = {name: value for name, value in settings.items() if self.values[name] != value}
+            if not changes:
+                return
+            self.values.update(changes)
+            self.dirty.update(changes)
+            self.last_change = time.monotonic()
+            subscribers = list(self.subscribers)
+        self.dirty_event.set()
+        for callback in subscribers:
+            try:
+                callback(changes)
+            except Exception as e:
+                self.db_handler.log_error(f"Error notifying settings subscriber: {str(e)}")
+
+    def subscribe(self, callback):
+        # callback(changes) runs on the thread that made the change, with a dict of the settings that changed
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def run(self):
+        while True:
+            self.dirty_event.wait()
+            # wait until the changes stop coming, so a burst of toggles becomes a single write
+            while True:
+                with self.lock:
+                    remaining = self.last_change + SETTINGS_WRITE_DELAY - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(remaining)
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                self.dirty_event.clear()
+                if not self.dirty:
+                    return
+                user_settings = {name: self.values[name] for name in USER_SETTINGS} \
+                    if self.dirty.intersection(USER_SETTINGS) else None
+                autoclean_settings = {name: self.values[name] for name in AUTOCLEAN_SETTINGS} \
+                    if self.dirty.intersection(AUTOCLEAN_SETTINGS) else None
+                self.dirty = set()
+            try:
+                self.db_handler.save_settings(user_settings, autoclean_settings)
+            except Exception as e:
+                self.db_handler.log_error(f"Error saving settings: {str(e)}")
@@ -0,0 +1,135 @@
+import os
+import time
+
+DAY_SECONDS = 24 * 60 * 60
+# files not accessed for this many days are unused under the default policy
+UNUSED_FILE_DAYS = 90
+
+
+def import_numpy():
+    # numpy is optional; without it snapshots stay as lists and policies are checked one file at a time
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class UnusedFilePolicy:
+    # Which files AutoClean treats as unused: not accessed for min_age_days, optionally also not modified for
+    # min_unmodified_days, within a size range and limited to or excluding some extensions (".tmp", ...)
+    def __init__(self, min_age_days=UNUSED_FILE_DAYS, min_unmodified_days=None, min_size=0, max_size=None,
+                 extensions=None, excluded_extensions=()):
+        self.min_age_days = min_age_days
+        self.min_unmodified_days = min_unmodified_days
+        self.min_size = min_size
+        self.max_size = max_size
+        self.extensions = {extension.lower() for extension in extensions} if extensions is not None else None
+        self.excluded_extensions = {extension.lower() for extension in excluded_extensions}
+
+    def matches(self, path, file_stat, now=None):
+        now = time.time() if now is None else now
+        extension = os.path.splitext(path)[1].lower()
+        return (file_stat.st_atime < now - self.min_age_days * DAY_SECONDS
+                and (self.min_unmodified_days is None
+                     or file_stat.st_mtime_ns < (now - self.min_unmodified_days * DAY_SECONDS) * 1e9)
+                and file_stat.st_size >= self.min_size
+                and (self.max_size is None or file_stat.st_size <= self.max_size)
+                and (self.extensions is None or extension in self.extensions)
+                and extension not in self.excluded_extensions)
+
+    def mask(self, snapshot, now=None):
+        # the same test as matches, over every file of a frozen snapshot at once
+        numpy = snapshot.numpy
+        now = time.time() if now is None else now
+        mask = snapshot.atimes < now - self.min_age_days * DAY_SECONDS
+        if self.min_unmodified_days is not None:
+            mask &= snapshot.mtimes < (now - self.min_unmodified_days * DAY_SECONDS) * 1e9
+        if self.min_size:
+            mask &= snapshot.sizes >= self.min_size
+        if self.max_size is not None:
+            mask &= snapshot.sizes <= self.max_size
+        if self.extensions is not None:
+            mask &= numpy.isin(snapshot.extension_ids, snapshot.get_extension_ids(self.extensions))
+        if self.excluded_extensions:
+            mask &= ~numpy.isin(snapshot.extension_ids, snapshot.get_extension_ids(self.excluded_extensions))
+        return mask
+
+
+class MetadataSnapshot:
+    # Columnar copy of the file metadata of one scanned tree: a path table and, once frozen, NumPy arrays of
+    # size, atime and mtime, so a policy is evaluated over every file without touching the disk
+    def __init__(self, root_directory):
+        self.root_directory = root_directory
+        self.numpy = None
+        self.paths = []
+        self.sizes = []
+        self.atimes = []
+        self.mtimes = []
+        # each distinct extension is stored once and referenced by index
+        self.extensions = {}
+        self.extension_ids = []
+        self.created = time.time()
+
+    def add(self, path, file_stat):
+        self.paths.append(path)
+        self.sizes.append(file_stat.st_size)
+        self.atimes.append(file_stat.st_atime)
+        self.mtimes.append(file_stat.st_mtime_ns)
+        self.extension_ids.append(self.extensions.setdefault(os.path.splitext(path)[1].lower(),
+                                                             len(self.extensions)))
+
+    def freeze(self):
+        numpy = import_numpy()
+        if numpy is None:
+            return self
+        self.numpy = numpy
+        self.sizes = numpy.array(self.sizes, dtype=numpy.int64)
+        self.atimes = numpy.array(self.atimes, dtype=numpy.float64)
+        self.mtimes = numpy.array(self.mtimes, dtype=numpy.int64)
+        self.extension_ids = numpy.array(self.extension_ids, dtype=numpy.int32)
+        return self
+
+    def discard(self, paths):
+        # drops the rows of files that are gone, keeping the order of the rest
+        if not paths:
+            return
+        kept = [i for i, path in enumerate(self.paths) if path not in paths]
+        self.paths = [self.paths[i] for i in kept]
+        for name in ('sizes', 'atimes', 'mtimes', 'extension_ids'):
+            column = getattr(self, name)
+            setattr(self, name, column[kept] if self.numpy is not None else [column[i] for i in kept])
+
+    def get_extension_ids(self, extensions):
+        return [i for extension, i in self.extensions.items() if extension in extensions]
+
+    def __len__(self):
+        return len(self.paths)
+
+    def select(self, policy, now=None):
+        # indexes of the files the policy matches
+        if self.numpy is not None:
+            return self.numpy.flatnonzero(policy.mask(self, now)).tolist()
+        now = time.time() if now is None else now
+        return [i for i in range(len(self.paths)) if policy.matches(self.paths[i], self.stat(i), now)]
+
+    def stat(self, i):
+        return FileMetadata(int(self.sizes[i]), float(self.atimes[i]), int(self.mtimes[i]))
+
+    def preview(self, policy, now=None, limit=20):
+        # what the policy would remove, from the snapshot alone
+        if self.numpy is not None:
+            mask = policy.mask(self, now)
+            return {'files': int(mask.sum()), 'bytes': int(self.sizes[mask].sum()),
+                    'paths': [self.paths[i] for i in self.numpy.flatnonzero(mask)[:limit]]}
+        selected = self.select(policy, now)
+        return {'files': len(selected), 'bytes': sum(self.sizes[i] for i in selected),
+                'paths': [self.paths[i] for i in selected[:limit]]}
+
+
+class FileMetadata:
+    # the stat fields a snapshot keeps, for checking a policy against one file
+    def __init__(self, st_size, st_atime, st_mtime_ns):
+        self.st_size = st_size
+        self.st_atime = st_atime
+        self.st_mtime_ns = st_mtime_ns
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session', autouse=True)
+def scratch_working_directory(tmp_path_factory):
+    # the handlers open peanut.db relative to the working directory and keep one connection per thread for
+    # the whole process, so every test shares one scratch database
+    working_directory = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('peanut'))
+    yield
+    os.chdir(working_directory)
@@ -0,0 +1,144 @@
+import datetime
+import os
+import threading
+import time
+
+import pytest
+import schedule
+
+import peanut
+import snapshot
+from autoclean import AutoCleanHandler
+from snapshot import UnusedFilePolicy
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    handler = AutoCleanHandler()
+    handler.frequency = 'day'
+    handler.clean_unused_files_flag = 1
+    handler.clean_empty_folders_flag = handler.clean_duplicate_files_flag = 0
+    handler.clean_recycling_bin_flag = handler.clean_browser_history_flag = 0
+    cleaned = []
+    monkeypatch.setattr(handler, 'get_default_directories', lambda: [str(tmp_path)])
+    monkeypatch.setattr(handler, 'clean_directories', lambda directories, **options: cleaned.append(directories))
+    handler.cleaned = cleaned
+    yield handler
+    handler.pause_operations()
+
+
+def test_scheduled_clean_runs_once_due(handler):
+    handler.next_cleaning_time = datetime.datetime.now() + datetime.timedelta(days=1)
+    handler.resume_operations()
+    schedule.run_all()
+    assert handler.cleaned == []
+
+    # falls due while the scheduler is running
+    handler.next_cleaning_time = datetime.datetime.now() - datetime.timedelta(seconds=1)
+    schedule.run_all()
+    assert len(handler.cleaned) == 1
+    assert handler.next_cleaning_time > datetime.datetime.now()
+
+
+def test_resume_keeps_a_due_clean(handler):
+    due = datetime.datetime.now() - datetime.timedelta(hours=1)
+    handler.next_cleaning_time = due
+    handler.resume_operations()
+    assert handler.next_cleaning_time == due
+    schedule.run_all()
+    assert len(handler.cleaned) == 1
+
+
+def hold_cleaning_lock(handler):
+    # a clean running on another thread
+    held, release = threading.Event(), threading.Event()
+
+    def run():
+        with handler.cleaning_lock:
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    held.wait(5)
+    return release, thread
+
+
+def test_scheduled_clean_skipped_while_cleaning(handler):
+    handler.next_cleaning_time = datetime.datetime.now() - datetime.timedelta(seconds=1)
+    release, thread = hold_cleaning_lock(handler)
+    handler.run_auto_cleaning()
+    release.set()
+    thread.join(5)
+    assert handler.cleaned == []
+
+
+def test_a_clean_waits_for_the_running_one(tmp_path):
+    (tmp_path / 'empty').mkdir()
+    handler = AutoCleanHandler()
+    release, thread = hold_cleaning_lock(handler)
+    cleaner = threading.Thread(target=handler.clean_directories, args=([str(tmp_path)],),
+                               kwargs={'empty_folders': True}, daemon=True)
+    cleaner.start()
+    cleaner.join(0.2)
+    assert cleaner.is_alive() and handler.metrics is None
+    assert (tmp_path / 'empty').exists()
+    release.set()
+    cleaner.join(5)
+    assert not cleaner.is_alive() and not (tmp_path / 'empty').exists()
+
+
+def test_unused_and_duplicate_clean_without_a_kept_snapshot(tmp_path):
+    old = time.time() - 365 * 24 * 60 * 60
+    for name in ('old_copy.txt', 'copy_a.txt', 'copy_b.txt'):
+        (tmp_path / name).write_text('same contents')
+    os.utime(tmp_path / 'old_copy.txt', (old, old))
+    root = os.path.realpath(tmp_path)
+    handler = AutoCleanHandler()
+    handler.use_catalog = False
+    handler.clean_directories([root], unused_files=True, duplicate_files=True)
+    # the unused file goes as unused, and only one of the two recent copies as a duplicate
+    assert sorted(os.listdir(root)) in (['copy_a.txt'], ['copy_b.txt'])
+    assert handler.snapshots == {}
+
+    (tmp_path / 'old.log').write_text('old')
+    os.utime(tmp_path / 'old.log', (old, old))
+    handler.keep_snapshots = True
+    handler.clean_directories([root], duplicate_files=True)
+    assert os.path.exists(tmp_path / 'old.log')
+    preview = handler.preview_unused_files()
+    assert preview['files'] == 1 and preview['paths'] == [os.path.join(root, 'old.log')]
+
+
+@pytest.mark.parametrize('with_numpy', [True, False])
+def test_a_kept_snapshot_leaves_out_the_files_the_clean_removed(tmp_path, monkeypatch, with_numpy):
+    if not with_numpy:
+        monkeypatch.setattr(snapshot, 'import_numpy', lambda: None)
+    old = time.time() - 365 * 24 * 60 * 60
+    recent = time.time() - 60 * 24 * 60 * 60
+    for name, accessed in (('old_1.log', old), ('old_2.log', old), ('recent.log', recent)):
+        (tmp_path / name).write_text(name)
+        os.utime(tmp_path / name, (accessed, accessed))
+    for name in ('copy_a.txt', 'copy_b.txt'):
+        (tmp_path / name).write_text('same contents')
+    root = os.path.realpath(tmp_path)
+    handler = AutoCleanHandler()
+    handler.keep_snapshots = True
+    handler.clean_directories([root], unused_files=True, duplicate_files=True)
+    assert not os.path.exists(tmp_path / 'old_1.log') and not os.path.exists(tmp_path / 'old_2.log')
+    assert handler.preview_unused_files()['files'] == 0
+    # a stricter policy, answered from what is left
+    preview = handler.preview_unused_files(UnusedFilePolicy(min_age_days=30))
+    assert preview['paths'] == [os.path.join(root, 'recent.log')]
+    assert preview['bytes'] == len('recent.log')
+
+
+def test_clean_can_preview_unused_files_from_the_command_line(tmp_path, capsys):
+    accessed = time.time() - 60 * 24 * 60 * 60
+    (tmp_path / 'report.log').write_text('report')
+    os.utime(tmp_path / 'report.log', (accessed, accessed))
+    root = os.path.realpath(tmp_path)
+    assert peanut.main(['clean', root, '--empty-folders', '--preview-unused', '30']) == 0
+    output = capsys.readouterr().out
+    assert "Files not accessed for 30 days: 1 (6 bytes)" in output
+    assert os.path.join(root, 'report.log') in output
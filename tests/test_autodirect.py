@@ -0,0 +1,54 @@
+import threading
+
+import schedule
+
+from autodirect import AutoDirectHandler
+from database import DatabaseHandler
+
+
+def test_catch_up_scan_runs_after_the_constructor_returns(tmp_path, monkeypatch):
+    from_directory = tmp_path / 'downloads'
+    to_directory = tmp_path / 'reports'
+    from_directory.mkdir()
+    to_directory.mkdir()
+    (from_directory / 'report_1.txt').write_text('q1')
+    db_handler = DatabaseHandler()
+    db_handler.clear_all_redirects()
+    db_handler.add_redirect('report', str(from_directory), str(to_directory))
+
+    release = threading.Event()
+    check_source_directory = AutoDirectHandler.check_source_directory
+
+    def blocked_check(self, directory, job=None):
+        release.wait(5)
+        check_source_directory(self, directory, job)
+
+    monkeypatch.setattr(AutoDirectHandler, 'check_source_directory', blocked_check)
+    handler = AutoDirectHandler()
+    try:
+        assert (from_directory / 'report_1.txt').exists()
+        release.set()
+        handler.catch_up_thread.join(5)
+        handler.wait_for_moves()
+        assert (to_directory / 'report_1.txt').exists()
+        assert not (from_directory / 'report_1.txt').exists()
+    finally:
+        release.set()
+        handler.pause_operations()
+        db_handler.clear_all_redirects()
+
+
+def test_loading_redirects_keeps_other_scheduled_jobs(tmp_path):
+    db_handler = DatabaseHandler()
+    db_handler.clear_all_redirects()
+    db_handler.add_redirect('report', str(tmp_path), str(tmp_path / 'reports'))
+    schedule.every().minute.do(lambda: None).tag('auto_clean')
+    try:
+        handler = AutoDirectHandler(use_watchdog=False)
+        handler.update_redirects()
+        assert len(schedule.get_jobs('autodirect')) == 1
+        assert len(schedule.get_jobs('auto_clean')) == 1
+    finally:
+        schedule.clear('autodirect')
+        schedule.clear('auto_clean')
+        db_handler.clear_all_redirects()
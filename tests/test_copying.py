@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+from copying import CopyEngine
+
+
+def test_a_kernel_copy_of_nothing_falls_back(tmp_path, monkeypatch):
+    src_path = tmp_path / 'src.bin'
+    src_path.write_bytes(os.urandom(100000))
+    engine = CopyEngine(workers=1)
+    engine.use_copy_file_range = engine.use_sendfile = True
+    # as on file systems where the call succeeds but copies nothing
+    monkeypatch.setattr(os, 'copy_file_range', lambda *args: 0, raising=False)
+    monkeypatch.setattr(os, 'sendfile', lambda *args: 0, raising=False)
+    assert engine.copy_file(str(src_path), str(tmp_path / 'dst.bin')) == 100000
+    assert (tmp_path / 'dst.bin').read_bytes() == src_path.read_bytes()
+    assert engine.get_throughput()['methods'] == {'copy_file_range': 0, 'sendfile': 0, 'read_write': 1}
+
+
+def test_a_short_copy_is_an_error(tmp_path, monkeypatch):
+    src_path = tmp_path / 'src.bin'
+    src_path.write_bytes(b'x' * 1000)
+    engine = CopyEngine(workers=1)
+    monkeypatch.setattr(engine, 'copy_contents', lambda src_fd, dst_fd, size: ('read_write', 10))
+    with pytest.raises(OSError):
+        engine.copy_file(str(src_path), str(tmp_path / 'dst.bin'))
+    assert engine.get_throughput()['files'] == 0
@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import time
+
+from autoclean import AutoCleanHandler
+from database import DatabaseHandler
+
+
+def test_a_root_does_not_match_its_sibling_with_a_longer_name(tmp_path):
+    for root in ('a', 'ab'):
+        (tmp_path / root / 'sub').mkdir(parents=True)
+        for i in range(2):
+            (tmp_path / root / 'sub' / f'copy_{i}.txt').write_text('same contents')
+    root_a = os.path.realpath(tmp_path / 'a')
+    root_ab = os.path.realpath(tmp_path / 'ab')
+    db_handler = DatabaseHandler()
+    handler = AutoCleanHandler()
+    handler.clean_directories([root_ab], duplicate_files=True)
+    catalog_ab = db_handler.get_catalog_directories(root_ab)
+    hashes_ab = {value['path'] for value in db_handler.get_file_hashes().values() if value['path'].startswith(root_ab)}
+    assert catalog_ab and hashes_ab
+
+    handler.clean_directories([root_a])
+    assert set(db_handler.get_catalog_directories(root_a)) == {root_a, os.path.join(root_a, 'sub')}
+    assert db_handler.get_catalog_summary(root_a)['files'] == 2
+
+    # cleaning /a must leave the catalog and hash cache of /ab alone
+    handler.clean_directories([root_a], duplicate_files=True)
+    assert db_handler.get_catalog_directories(root_ab) == catalog_ab
+    assert hashes_ab <= {value['path'] for value in db_handler.get_file_hashes().values()}
+
+
+def test_a_locked_database_requeues_log_rows_and_keeps_the_writer_alive(monkeypatch):
+    db_handler = DatabaseHandler()
+    log_writer = db_handler.log_writer
+    thread_connection = DatabaseHandler.thread_connection
+    failures = []
+
+    def locked_once(db_file):
+        if not failures:
+            failures.append(db_file)
+            raise sqlite3.OperationalError('database is locked')
+        return thread_connection(db_file)
+
+    monkeypatch.setattr(DatabaseHandler, 'thread_connection', staticmethod(locked_once))
+    db_handler.log_error('written after the lock clears')
+    log_writer.wake_event.set()
+    deadline = time.monotonic() + 10
+    while not thread_connection(db_handler.db_file).execute('''SELECT 1 FROM ErrorLogs WHERE description = ?''',
+                                                           ('written after the lock clears',)).fetchone():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert failures and log_writer.thread.is_alive()
+    assert db_handler.get_log_write_stats()['failed'] >= 1
+
+
+def test_a_new_database_uses_incremental_vacuum(tmp_path):
+    db_handler = object.__new__(DatabaseHandler)
+    db_handler.db_file = str(tmp_path / 'new.db')
+    db_handler.create_tables()
+    conn = db_handler.connect()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    conn.close()
+    DatabaseHandler.local.connections.pop(db_handler.db_file)
@@ -0,0 +1,74 @@
+import os
+from collections import namedtuple
+
+import pytest
+
+from autoclean import AutoCleanHandler
+from manifest import count_entries, fingerprint, matches_fingerprint, read_manifest
+
+# what DirEntry.stat() reports on Windows: no device or inode
+ScandirStat = namedtuple('ScandirStat', ['st_dev', 'st_ino', 'st_size', 'st_mtime_ns', 'st_atime_ns'])
+
+
+def test_fingerprint_from_a_stat_without_identity_matches_the_real_stat(tmp_path):
+    path = tmp_path / 'old.log'
+    path.write_text('unused')
+    file_stat = os.stat(path)
+    scandir_stat = ScandirStat(0, 0, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_atime_ns)
+    expected = fingerprint(scandir_stat, 'unused')
+    assert 'ino' not in expected
+    assert matches_fingerprint(os.stat(path), expected)
+
+    path.write_text('changed since the plan')
+    assert not matches_fingerprint(os.stat(path), expected)
+
+
+def plan_duplicates(tmp_path, copies):
+    root = tmp_path / 'root'
+    root.mkdir()
+    for i in range(copies):
+        (root / f'copy_{i}.txt').write_text('same contents')
+    manifest_path = str(tmp_path / 'plan.ndjson')
+    handler = AutoCleanHandler()
+    handler.plan_directories([os.path.realpath(root)], manifest_path, duplicate_files=True)
+    return handler, manifest_path, list(read_manifest(manifest_path))
+
+
+def test_a_plan_deletes_nothing_until_applied(tmp_path):
+    handler, manifest_path, entries = plan_duplicates(tmp_path, 3)
+    assert count_entries(manifest_path) == len(entries) == 2
+    assert all(os.path.exists(entry['path']) and entry['reason'] == 'duplicate' for entry in entries)
+    kept = {entry['original'] for entry in entries}
+    assert len(kept) == 1 and os.path.exists(kept.pop())
+    assert handler.apply_manifest(manifest_path)['removed'] == 2
+    assert len(os.listdir(tmp_path / 'root')) == 1
+
+
+def test_changed_and_missing_entries_are_skipped(tmp_path):
+    handler, manifest_path, entries = plan_duplicates(tmp_path, 4)
+    changed, missing, orphaned = entries
+    with open(changed['path'], 'a') as f:
+        f.write(' and more')
+    os.remove(missing['path'])
+    assert handler.apply_entry(changed) == 'changed'
+    assert handler.apply_entry(missing) == 'missing'
+    assert os.path.exists(changed['path'])
+
+    # the copy a duplicate was kept in favour of has gone, so the duplicate is no longer one
+    os.remove(orphaned['original'])
+    assert handler.apply_entry(orphaned) == 'changed'
+    assert os.path.exists(orphaned['path'])
+
+
+def test_a_kept_copy_that_changed_blocks_the_deletion(tmp_path):
+    handler, manifest_path, entries = plan_duplicates(tmp_path, 2)
+    with open(entries[0]['original'], 'w') as f:
+        f.write('edited after the plan')
+    assert handler.apply_manifest(manifest_path) == {'removed': 0, 'changed': 1, 'missing': 0, 'failed': 0}
+
+
+def test_a_file_that_is_not_a_manifest_is_refused(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('{"something": "else"}\n')
+    with pytest.raises(ValueError):
+        list(read_manifest(str(path)))
@@ -0,0 +1,28 @@
+import random
+
+from matcher import KeywordMatcher
+
+
+def naive_find_all(keywords, text):
+    return {i for i, keyword in enumerate(keywords) if keyword in text}
+
+
+def test_overlapping_and_nested_keywords():
+    keywords = ['he', 'she', 'his', 'hers', 'e', 'hershey']
+    matcher = KeywordMatcher(keywords)
+    for text in ('ushers', 'hershey', 'h', '', 'shis'):
+        assert matcher.find_all(text) == naive_find_all(keywords, text)
+
+
+def test_matches_naive_search_on_random_names():
+    rng = random.Random(16)
+    for _ in range(200):
+        keywords = [''.join(rng.choice('abc.') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+        matcher = KeywordMatcher(keywords)
+        for _ in range(20):
+            text = ''.join(rng.choice('abc._') for _ in range(rng.randint(0, 30)))
+            assert matcher.find_all(text) == naive_find_all(keywords, text), (keywords, text)
+
+
+def test_an_empty_keyword_matches_everything():
+    assert KeywordMatcher(['', 'x']).find_all('abc') == {0}
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from database import DatabaseHandler
+from renaming import RenamePlanner
+
+
+def make_files(directory, contents):
+    for name, text in contents.items():
+        (directory / name).write_text(text)
+    return [str(directory / name) for name in contents]
+
+
+def read_files(directory):
+    return {name: (directory / name).read_text() for name in os.listdir(directory)}
+
+
+def is_last_batch(planner, batch_id):
+    batch = planner.db_handler.get_last_rename_batch()
+    return batch is not None and batch[0] == batch_id
+
+
+@pytest.fixture
+def planner():
+    return RenamePlanner(DatabaseHandler(), ['.txt'])
+
+
+def test_a_swap_goes_through_a_temporary_name(tmp_path, planner):
+    files = make_files(tmp_path, {'a_1.txt': 'first', 'a_2.txt': 'second'})
+    planner.new_name = lambda filename, find, replace: {'a_1.txt': 'a_2.txt', 'a_2.txt': 'a_1.txt'}[filename]
+    steps, skipped = planner.plan(files, 'x', 'y')
+    assert skipped == [] and len(steps) == 3
+    planner.execute(steps, 'swap')
+    assert read_files(tmp_path) == {'a_1.txt': 'second', 'a_2.txt': 'first'}
+
+
+def test_a_cycle_and_a_chain_keep_every_file(tmp_path, planner):
+    files = make_files(tmp_path, {'1.txt': 'one', '2.txt': 'two', '3.txt': 'three', 'x.txt': 'x'})
+    names = {'1.txt': '2.txt', '2.txt': '3.txt', '3.txt': '1.txt', 'x.txt': 'y.txt'}
+    planner.new_name = lambda filename, find, replace: names[filename]
+    steps, skipped = planner.plan(files, 'x', 'y')
+    assert skipped == []
+    batch_id = planner.execute(steps, 'cycle')
+    assert read_files(tmp_path) == {'2.txt': 'one', '3.txt': 'two', '1.txt': 'three', 'y.txt': 'x'}
+
+    assert planner.undo_last() == 5
+    assert read_files(tmp_path) == {'1.txt': 'one', '2.txt': 'two', '3.txt': 'three', 'x.txt': 'x'}
+    # an undone batch is not undone twice
+    assert not is_last_batch(planner, batch_id)
+
+
+def test_collisions_and_existing_targets_are_skipped(tmp_path, planner):
+    files = make_files(tmp_path, {'a.txt': 'a', 'b.txt': 'b', 'c.txt': 'c', 'd.txt': 'kept'})
+    names = {'a.txt': 'z.txt', 'b.txt': 'z.txt', 'c.txt': 'd.txt', 'd.txt': 'd.txt'}
+    planner.new_name = lambda filename, find, replace: names[filename]
+    steps, skipped = planner.plan(files, 'x', 'y')
+    assert steps == []
+    assert sorted(os.path.basename(file) for file, reason in skipped) == ['a.txt', 'b.txt', 'c.txt']
+
+
+def test_a_failed_rename_rolls_back_the_batch(tmp_path, planner, monkeypatch):
+    files = make_files(tmp_path, {'1.txt': 'one', '2.txt': 'two', '3.txt': 'three'})
+    names = {'1.txt': '2.txt', '2.txt': '3.txt', '3.txt': '1.txt'}
+    planner.new_name = lambda filename, find, replace: names[filename]
+    steps, _ = planner.plan(files, 'x', 'y')
+    rename = os.rename
+    calls = []
+
+    def fail_third(src_path, dst_path):
+        calls.append(src_path)
+        if len(calls) == 3:
+            raise PermissionError(13, 'Permission denied', src_path)
+        rename(src_path, dst_path)
+
+    monkeypatch.setattr(os, 'rename', fail_third)
+    start_rename_batch = planner.db_handler.start_rename_batch
+    batch_ids = []
+    monkeypatch.setattr(planner.db_handler, 'start_rename_batch',
+                        lambda *args: batch_ids.append(start_rename_batch(*args)) or batch_ids[-1])
+    with pytest.raises(PermissionError):
+        planner.execute(steps, 'cycle')
+    assert read_files(tmp_path) == {'1.txt': 'one', '2.txt': 'two', '3.txt': 'three'}
+    # the rolled back batch is not offered for undo
+    assert not is_last_batch(planner, batch_ids[0])
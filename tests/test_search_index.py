@@ -0,0 +1,61 @@
+import time
+
+import search_index
+from multisearch import MultiSearchHandler
+
+
+def wait_for_results(handler, keyword, directory, expected):
+    deadline = time.monotonic() + 10
+    while handler.multi_search_for_files(keyword, directory) != expected:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_searches_read_the_index_without_refreshing_it(tmp_path, monkeypatch):
+    root = tmp_path / 'indexed'
+    (root / 'docs').mkdir(parents=True)
+    (root / 'docs' / 'report_q1.txt').write_text('q1')
+    handler = MultiSearchHandler()
+    assert handler.enable_search_index([str(root)])
+
+    # a new handler (a new session) picks up the persisted index
+    handler = MultiSearchHandler()
+    assert handler.is_indexed(str(root / 'docs'))
+
+    # no walk and no stat on the query path: a file created since is only found after a refresh
+    monkeypatch.setattr(search_index, 'walk_entries', None)
+    (root / 'docs' / 'report_q2.txt').write_text('q2')
+    assert handler.multi_search_for_files('report', str(root)) == [str(root / 'docs' / 'report_q1.txt')]
+    monkeypatch.undo()
+    handler.refresh_search_index()
+    assert sorted(handler.multi_search_for_files('report', str(root))) == [
+        str(root / 'docs' / 'report_q1.txt'), str(root / 'docs' / 'report_q2.txt')]
+
+
+def test_background_refresh_follows_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, 'INDEX_SETTLE_SECONDS', 0.1)
+    root = tmp_path / 'watched'
+    (root / 'docs' / 'old').mkdir(parents=True)
+    (root / 'docs' / 'report_q1.txt').write_text('q1')
+    handler = MultiSearchHandler()
+    assert handler.enable_search_index([str(root)])
+    full_passes = []
+    refresh = handler.filename_index.refresh
+    monkeypatch.setattr(handler.filename_index, 'refresh',
+                        lambda cancel_event=None: full_passes.append(refresh(cancel_event)))
+    handler.start_search_index_refresh()
+    try:
+        # after the catch-up pass, changes reach the index through the observer alone
+        deadline = time.monotonic() + 10
+        while not full_passes:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        (root / 'docs' / 'old' / 'report_q2.txt').write_text('q2')
+        (root / 'docs' / 'report_q1.txt').unlink()
+        wait_for_results(handler, 'report', str(root), [str(root / 'docs' / 'old' / 'report_q2.txt')])
+        (root / 'new').mkdir()
+        (root / 'new' / 'report_q3.txt').write_text('q3')
+        wait_for_results(handler, 'report_q3', str(root), [str(root / 'new' / 'report_q3.txt')])
+    finally:
+        handler.stop_search_index_refresh()
+    assert len(full_passes) == 1 and handler.filename_index.refresh_thread is None
@@ -0,0 +1,77 @@
+import os
+import threading
+
+from traversal import walk_entries
+
+
+def make_tree(root, depth, width):
+    if depth == 0:
+        return
+    for i in range(width):
+        child = root / f'd{i}'
+        child.mkdir()
+        (child / 'file.txt').write_text('x')
+        make_tree(child, depth - 1, width)
+
+
+def test_every_directory_comes_after_its_parent(tmp_path):
+    make_tree(tmp_path, 3, 3)
+    seen = {}
+    for directory_path, entries, depth in walk_entries(str(tmp_path), workers=4):
+        parent = os.path.dirname(directory_path)
+        assert directory_path == str(tmp_path) or parent in seen
+        assert depth == (seen[parent] + 1 if parent in seen else 0)
+        seen[directory_path] = depth
+    assert len(seen) == 1 + 3 + 9 + 27
+
+
+def test_prune_and_max_depth(tmp_path):
+    make_tree(tmp_path, 3, 2)
+    walked = [directory_path for directory_path, _, _ in
+              walk_entries(str(tmp_path), prune=lambda entry: entry.name == 'd0', max_depth=2)]
+    assert sorted(os.path.relpath(path, tmp_path) for path in walked) == ['.', 'd1', os.path.join('d1', 'd1')]
+
+
+def test_stopping_early_stops_listing(tmp_path):
+    make_tree(tmp_path, 3, 3)
+    listed = []
+    # the worker lists one directory per directory the caller takes, so it cannot run ahead of the walk
+    permits = threading.Semaphore(1)
+
+    def lister(directory_path):
+        permits.acquire(timeout=5)
+        listed.append(directory_path)
+        with os.scandir(directory_path) as it:
+            return list(it)
+
+    cancel_event = threading.Event()
+    walked = []
+    for directory_path, _, _ in walk_entries(str(tmp_path), workers=1, lister=lister, cancel_event=cancel_event):
+        walked.append(directory_path)
+        if len(walked) == 2:
+            cancel_event.set()
+        permits.release()
+    assert len(walked) == 2
+    assert len(listed) <= 3
+
+    walked = []
+    for directory_path, _, _ in walk_entries(str(tmp_path), workers=1):
+        walked.append(directory_path)
+        break
+    assert walked == [str(tmp_path)]
+
+
+def test_errors_are_reported_not_raised(tmp_path):
+    make_tree(tmp_path, 1, 2)
+    errors = []
+
+    def lister(directory_path):
+        if directory_path.endswith('d0'):
+            raise PermissionError(13, 'Permission denied', directory_path)
+        with os.scandir(directory_path) as it:
+            return list(it)
+
+    walked = [path for path, _, _ in walk_entries(str(tmp_path), lister=lister,
+                                                   on_error=lambda path, error: errors.append(path))]
+    assert sorted(os.path.relpath(path, tmp_path) for path in walked) == ['.', 'd1']
+    assert [os.path.relpath(path, tmp_path) for path in errors] == ['d0']
@@ -0,0 +1,99 @@
+import os
+import queue
+import threading
+
+# directory listing is dominated by stat latency, not CPU, so more workers than cores still helps
+TRAVERSAL_WORKERS = 8
+
+
+def list_directory(directory_path):
+    with os.scandir(directory_path) as it:
+        return list(it)
+
+
+def walk_entries(roots, workers=TRAVERSAL_WORKERS, max_depth=None, prune=None, follow_symlinks=False,
+                 lister=list_directory, on_error=None, cancel_event=None):
+    # Yields (directory_path, entries, depth) for every directory under roots, listing directories on a
+    # pool of threads. A directory is always yielded before any of its subdirectories. prune(entry) and
+    # lister(path) run on the worker threads; a directory entry for which prune returns True is not entered.
+    if isinstance(roots, str):
+        roots = [roots]
+    work_queue = queue.Queue()
+    results_queue = queue.Queue()
+    stop_event = threading.Event()
+    state = {'pending': len(roots)}
+    state_lock = threading.Lock()
+    seen_directories = set()
+    done = object()
+
+    def should_enter(entry, depth):
+        if max_depth is not None and depth >= max_depth:
+            return False
+        if not entry.is_dir(follow_symlinks=follow_symlinks):
+            return False
+        if prune is not None and prune(entry):
+            return False
+        if follow_symlinks and entry.is_symlink():
+            # a followed link can lead back up the tree, so every real directory is only entered once
+            real_path = os.path.realpath(entry.path)
+            with state_lock:
+                if real_path in seen_directories:
+                    return False
+                seen_directories.add(real_path)
+        return True
+
+    def worker():
+        while True:
+            item = work_queue.get()
+            if item is None:
+                return
+            directory_path, depth = item
+            try:
+                if not stop_event.is_set():
+                    entries = lister(directory_path)
+                    results_queue.put((directory_path, entries, depth, None))
+                    for entry in entries:
+                        try:
+                            enter = should_enter(entry, depth)
+                        except OSError:
+                            enter = False
+                        if enter:
+                            with state_lock:
+                                state['pending'] += 1
+                            work_queue.put((entry.path, depth + 1))
+            except Exception as e:
+                results_queue.put((directory_path, None, depth, e))
+            finally:
+                with state_lock:
+                    state['pending'] -= 1
+                    finished = state['pending'] == 0
+                if finished:
+                    results_queue.put(done)
+
+    if not roots:
+        return
+    if follow_symlinks:
+        seen_directories.update(os.path.realpath(root) for root in roots)
+    for root in roots:
+        work_queue.put((root, 0))
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = results_queue.get()
+            if item is done:
+                break
+            directory_path, entries, depth, error = item
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            if error is not None:
+                if on_error is not None:
+                    on_error(directory_path, error)
+                continue
+            yield directory_path, entries, depth
+    finally:
+        # also runs when the caller stops iterating early: queued directories are skipped, not listed
+        stop_event.set()
+        for _ in threads:
+            work_queue.put(None)